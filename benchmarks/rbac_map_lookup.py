@@ -0,0 +1,59 @@
+"""
+RBACMap.find lookup benchmark
+
+Generates synthetic RBAC maps of growing size and measures the average cost of
+a single RBACMap.find call. Lookup cost must stay flat as the map grows.
+
+Usage (from repository root):
+    python benchmarks/rbac_map_lookup.py
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from undore_rbac.types.rbac_map import RBACMap  # noqa: E402
+
+SIZES = (100, 1_000, 5_000, 20_000)
+LOOKUPS = 10_000
+
+
+def generate_map(size: int) -> dict:
+    """
+    Generate a nested map with `size` leaf permissions, 20 leaves per namespace
+    """
+    permission_map: dict = {}
+
+    for i in range(size):
+        namespace = permission_map.setdefault(f"namespace{i // 20}", {})
+        namespace[f"action{i % 20}"] = None
+
+    return permission_map
+
+
+def main():
+    random.seed(0)
+    print(f"{'map size':>10} {'find (ns/op)':>14}")
+
+    for size in SIZES:
+        with tempfile.NamedTemporaryFile("w", suffix=".yml", delete=False) as f:
+            yaml.safe_dump(generate_map(size), f)
+
+        try:
+            rbac_map = RBACMap(f.name)
+        finally:
+            os.unlink(f.name)
+
+        names = [i.permission for i in random.choices(rbac_map, k=LOOKUPS)]
+
+        elapsed = min(timeit.repeat(lambda: [rbac_map.find(i) for i in names], number=1, repeat=5))
+        print(f"{len(rbac_map):>10} {elapsed / LOOKUPS * 1e9:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
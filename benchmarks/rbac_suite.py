@@ -0,0 +1,342 @@
+"""
+UndoreRBAC benchmark suite
+
+Generates synthetic RBAC maps (with children, explicit and default permissions), users with roles,
+scoped permissions and wildcards, and guard requirement sets. Measures:
+
+- RBACMap load time and memory: YAML parse, and load from a warm map cache
+- RBACGate construction
+- user_permissions compilation: without and with the shared role layers cache
+- check_access latency: raw permissions and compiled RBACRequirements, first check (compiles the snapshot) and repeated checks
+- memory of a compiled gate
+
+Results are written as JSON, so runs on different commits can be compared:
+
+Usage (from repository root):
+    python benchmarks/rbac_suite.py --output before.json
+    git checkout ... && python benchmarks/rbac_suite.py --output after.json --compare before.json
+    python benchmarks/rbac_suite.py --quick  # Small maps only, fewer repeats
+"""
+import argparse
+import datetime as dt
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from undore_rbac.base_manager import BaseRBACManager  # noqa: E402
+from undore_rbac.interfaces.config import RBACConfig  # noqa: E402
+from undore_rbac.interfaces.permissions import IRBACPermission, IRBACRole  # noqa: E402
+from undore_rbac.processes.gate import RBACGate  # noqa: E402
+from undore_rbac.types.rbac_map import RBACMap  # noqa: E402
+from undore_rbac.utils.ttl_cache import TTLCache  # noqa: E402
+
+SIZES = (100, 1_000, 10_000, 50_000)
+QUICK_SIZES = (100, 1_000)
+ACTIONS_PER_NAMESPACE = 20
+
+# name: (roles, permissions per role, scoped permissions, wildcards)
+USER_PROFILES = {
+    "small": (1, 10, 5, 0),
+    "medium": (5, 50, 50, 2),
+    "large": (20, 200, 500, 10),
+}
+REQUIREMENT_SIZES = (1, 5, 20)
+
+T0 = dt.datetime(2025, 1, 1)
+
+
+class _BenchmarkManager(BaseRBACManager):
+    async def authorize(self, token, request=None, custom_meta=None):
+        raise NotImplementedError
+
+    async def fetch_user_access(self, user_id, custom_meta=None):
+        raise NotImplementedError
+
+
+def generate_map(size: int) -> dict:
+    """
+    Nested map with about `size` permissions: namespaces of ACTIONS_PER_NAMESPACE actions, some of them with sub-actions.
+    Every 50th action has children (later actions of the same namespace, so there are no cycles),
+    every 100th is explicit and every 30th is granted by default
+    """
+    permission_map: dict = {}
+    count = 0
+    i = 0
+
+    while count < size:
+        namespace_name, action = f"namespace{i // ACTIONS_PER_NAMESPACE}", i % ACTIONS_PER_NAMESPACE
+        namespace = permission_map.setdefault(namespace_name, {})
+        count += 1 if namespace else 2  # Namespace itself is a permission as well
+
+        node: dict = {}
+        config: dict = {}
+
+        if i % 50 == 0 and action < ACTIONS_PER_NAMESPACE - 2:
+            config["children"] = [{f"{namespace_name}.action{action + 1}": True}, {f"{namespace_name}.action{action + 2}": False}]
+        if i % 100 == 7:
+            config["explicit"] = True
+        if i % 30 == 3:
+            config["default"] = True
+        if config:
+            node["_config"] = config
+
+        if i % 7 == 0:
+            node["own"] = None
+            node["other"] = None
+            count += 2
+
+        namespace[f"action{action}"] = node or None
+        i += 1
+
+    return permission_map
+
+
+def generate_user(rbac_map: RBACMap, profile: str, rng: random.Random) -> tuple[list[IRBACPermission], list[IRBACRole]]:
+    """
+    Role permissions, scoped permissions (newest first) and wildcards of a user, chosen at random from the map
+    """
+    roles_count, role_permissions, scoped_count, wildcards = USER_PROFILES[profile]
+    names = [i.permission for i in rbac_map if not i.permission.startswith("undore_rbac")]
+    namespaces = sorted({i.split(".", 1)[0] for i in names})
+
+    roles = [IRBACRole(id=f"role{i}", priority=rng.randint(0, 100)) for i in range(roles_count)]
+    permissions: list[IRBACPermission] = []
+    next_id = 0
+
+    for role in roles:
+        for name in rng.sample(names, min(role_permissions, len(names))):
+            permissions.append(IRBACPermission(id=next_id, permission=name, role_id=role.id, value=rng.random() < 0.8,
+                                               created_at=T0 - dt.timedelta(seconds=next_id)))
+            next_id += 1
+
+    scoped = rng.sample(names, min(scoped_count, len(names))) + [f"{rng.choice(namespaces)}.*" for _ in range(wildcards)]
+    rng.shuffle(scoped)
+
+    for name in scoped:
+        permissions.append(IRBACPermission(id=next_id, permission=name, user_id="user", value=rng.random() < 0.7,
+                                           created_at=T0 - dt.timedelta(seconds=next_id)))
+        next_id += 1
+
+    return permissions, roles
+
+
+def measure(function: Callable[[], Any], number: int, repeat: int, setup: Callable[[], Any] | None = None) -> dict:
+    """
+    Per-call time in microseconds. Each repeat runs the function `number` times, GC is disabled while timing
+    """
+    timings = []
+
+    for _ in range(repeat):
+        if setup:
+            setup()
+
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            timings.append((time.perf_counter() - start) / number * 1e6)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    return {"min_us": min(timings), "median_us": statistics.median(timings), "number": number, "repeat": repeat}
+
+
+def measure_memory(function: Callable[[], Any]) -> dict:
+    """
+    Memory allocated by a call: kept after it returns (result is alive) and peak while it runs, in KiB
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del result
+    return {"retained_kib": current / 1024, "peak_kib": peak / 1024}
+
+
+def benchmark_map_load(path: str, repeat: int) -> dict:
+    cache_path = path + ".cache.json"
+    number = max(1, repeat // 2)
+
+    try:
+        return {
+            "parse": measure(lambda: RBACMap(path), number=1, repeat=number),
+            "cached": measure(lambda: RBACMap(path, cache_path=cache_path), number=1, repeat=number, setup=lambda: RBACMap(path, cache_path=cache_path)),
+            "memory": measure_memory(lambda: RBACMap(path)),
+        }
+    finally:
+        if os.path.exists(cache_path):
+            os.unlink(cache_path)
+
+
+def benchmark_gates(rbac_map: RBACMap, config: RBACConfig, rng: random.Random, repeat: int) -> dict:
+    names = [i.permission for i in rbac_map if not i.permission.startswith("undore_rbac")]
+    results = {}
+
+    for profile in USER_PROFILES:
+        permissions, roles = generate_user(rbac_map, profile, rng)
+        role_layers = TTLCache(1024)
+
+        def new_gate(layers: TTLCache | None = None) -> RBACGate:
+            return RBACGate(user_permissions=permissions, user_roles=roles, rbac_map=rbac_map, role_layers=layers, config=config)
+
+        def compiled_gate() -> RBACGate:
+            gate = new_gate(role_layers)
+            gate.snapshot  # noqa: B018
+            return gate
+
+        compiled_gate()  # Warm up role layers cache
+
+        profile_results = {
+            "permissions": len(permissions),
+            "construct": measure(new_gate, number=1000, repeat=repeat),
+            "user_permissions": measure(lambda: new_gate().user_permissions, number=20, repeat=repeat),
+            "user_permissions_cached_roles": measure(lambda: new_gate(role_layers).user_permissions, number=20, repeat=repeat),
+            "memory": measure_memory(compiled_gate),
+            "check_access": {},
+        }
+
+        for size in REQUIREMENT_SIZES:
+            required = rng.sample(names, min(size, len(names)))
+            requirements = rbac_map.compile_requirements(required)
+            gate = compiled_gate()
+
+            profile_results["check_access"][str(size)] = {
+                "first": measure(lambda: new_gate(role_layers).check_access(requirements, auto_error=False), number=20, repeat=repeat),
+                "raw": measure(lambda: gate.check_access(required, auto_error=False), number=1000, repeat=repeat),
+                "compiled": measure(lambda: gate.check_access(requirements, auto_error=False), number=1000, repeat=repeat),
+            }
+
+        results[profile] = profile_results
+
+    return results
+
+
+def run(sizes: tuple[int, ...], repeat: int, seed: int) -> dict:
+    config = RBACConfig(rbac_map_path="", rbac_manager=_BenchmarkManager(), require_sorted_permissions=True)
+    results: dict[str, Any] = {"meta": metadata(seed, repeat), "maps": {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            rng = random.Random(seed)
+            path = os.path.join(directory, f"rbac_map_{size}.yml")
+
+            with open(path, "w") as f:
+                yaml.safe_dump(generate_map(size), f)
+
+            rbac_map = RBACMap(path)
+            print(f"map size={len(rbac_map)}", file=sys.stderr)
+
+            results["maps"][str(size)] = {
+                "permissions": len(rbac_map),
+                "load": benchmark_map_load(path, repeat),
+                "users": benchmark_gates(rbac_map, config, rng, repeat),
+            }
+
+    return results
+
+
+def metadata(seed: int, repeat: int) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "date": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """
+    {"maps": {"100": {"load": {"parse": {"min_us": 1}}}}} -> {"maps.100.load.parse.min_us": 1}
+    """
+    flat = {}
+
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+
+    return flat
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """
+    Print metrics, which differ from the baseline by more than `threshold` (as a fraction)
+
+    :return: Amount of regressions
+    """
+    current, previous = flatten(results["maps"]), flatten(baseline["maps"])
+    regressions = 0
+
+    for name in sorted(current.keys() & previous.keys()):
+        if not name.endswith(("min_us", "_kib")) or not previous[name]:
+            continue
+
+        ratio = current[name] / previous[name]
+        if abs(ratio - 1) > threshold:
+            regressions += ratio > 1
+            print(f"{'REGRESSION' if ratio > 1 else 'improvement':>11} {ratio:6.2f}x {name}: {previous[name]:.1f} -> {current[name]:.1f}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", help=f"Map sizes (default: {' '.join(map(str, SIZES))})")
+    parser.add_argument("--quick", action="store_true", help=f"Only map sizes {', '.join(map(str, QUICK_SIZES))} and 3 repeats")
+    parser.add_argument("--repeat", type=int, default=7, help="Repeats of every measurement, the best one is reported as min_us")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative difference reported by --compare (default: 0.1)")
+    args = parser.parse_args()
+
+    sizes = tuple(args.sizes or (QUICK_SIZES if args.quick else SIZES))
+    results = run(sizes, 3 if args.quick else args.repeat, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
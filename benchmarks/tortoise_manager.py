@@ -0,0 +1,191 @@
+"""
+TortoiseRBACManager benchmark
+
+Seeds a local SQLite database (example entities from src/entities) with users, roles, role permissions and scoped permissions
+(some of them expired), and compares fetch_user_access of:
+
+- sequential: the previous example manager, three sequential ORM queries (user roles, roles, permissions)
+- reference: TortoiseRBACManager, one UNION ALL query with only the needed columns
+
+Both managers must return the same permissions and roles, it is checked before measuring.
+
+Usage (from repository root):
+    python benchmarks/tortoise_manager.py
+    python benchmarks/tortoise_manager.py --users 5000 --role-permissions 200 --output results.json
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from tortoise import Tortoise, timezone  # noqa: E402
+from tortoise.expressions import Q  # noqa: E402
+
+from entities.permissions import PermissionEntity, RoleEntity, UserRoles  # noqa: E402
+from entities.users import UserEntity  # noqa: E402
+from undore_rbac.base_manager import BaseRBACManager, Access  # noqa: E402
+from undore_rbac.interfaces.permissions import RoleRecord, as_permission_record, as_role_record  # noqa: E402
+from undore_rbac.managers.tortoise_manager import TortoiseRBACManager  # noqa: E402
+from undore_rbac.managers.tortoise_migrations import apply_indexes  # noqa: E402
+
+
+class SequentialManager(BaseRBACManager):
+    """
+    The previous example manager (shared/custom_rbac_manager.py), with the expiry filter parenthesized correctly
+    """
+    async def authorize(self, token, request=None, custom_meta=None):
+        raise NotImplementedError
+
+    async def fetch_user_access(self, user_id: Any = None, custom_meta: Optional[dict] = None) -> Access:
+        if isinstance(user_id, str):
+            user_id = int(user_id)
+
+        user_role_ids = [i.role_id for i in await UserRoles.filter(user_id=user_id)]
+        user_roles = [RoleRecord(*i) for i in await RoleEntity.filter(Q(id__in=user_role_ids)).values_list("id", "priority")]
+
+        results = PermissionEntity.filter(
+            (Q(user_id=user_id) | Q(role_id__in=[i.id for i in user_roles])) & (Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()))
+        )
+
+        return {
+            "permissions": await results.order_by('-created_at').values_list("id", "permission", "user_id", "role_id", "value", "created_at"),
+            "roles": user_roles,
+            "user": None
+        }
+
+
+class ReferenceManager(TortoiseRBACManager):
+    def __init__(self):
+        super().__init__(permission_model=PermissionEntity, role_model=RoleEntity, user_role_model=UserRoles)
+
+    async def authorize(self, token, request=None, custom_meta=None):
+        raise NotImplementedError
+
+
+async def seed(rng: random.Random, users: int, roles: int, roles_per_user: int, role_permissions: int, scoped_permissions: int) -> None:
+    now = timezone.now()
+
+    await UserEntity.bulk_create([UserEntity(id=i + 1, name=f"user{i}") for i in range(users)], batch_size=1000)
+    await RoleEntity.bulk_create([RoleEntity(id=i + 1, priority=rng.randint(0, 100)) for i in range(roles)], batch_size=1000)
+    await UserRoles.bulk_create([
+        UserRoles(user_id=user_id + 1, role_id=role_id + 1)
+        for user_id in range(users) for role_id in rng.sample(range(roles), roles_per_user)
+    ], batch_size=1000)
+
+    def permission(**kwargs) -> PermissionEntity:
+        expires_at = None
+        if rng.random() < 0.1:  # Some permissions are temporary, half of these already expired
+            expires_at = now + dt.timedelta(days=rng.choice((-1, 1)))
+
+        return PermissionEntity(
+            permission=f"namespace{rng.randrange(100)}.action{rng.randrange(20)}", value=rng.random() < 0.9, expires_at=expires_at,
+            created_at=now - dt.timedelta(seconds=rng.randrange(10_000_000)), **kwargs
+        )
+
+    await PermissionEntity.bulk_create([permission(role_id=i + 1) for i in range(roles) for _ in range(role_permissions)], batch_size=1000)
+    await PermissionEntity.bulk_create([permission(user_id=i + 1) for i in range(users) for _ in range(scoped_permissions)], batch_size=1000)
+
+
+def normalized(access: Access) -> tuple:
+    return (
+        sorted(tuple(as_permission_record(i))[:5] for i in access["permissions"]),
+        sorted(tuple(as_role_record(i))[:2] for i in access["roles"]),
+    )
+
+
+async def measure(manager: BaseRBACManager, user_ids: list[int], repeat: int) -> dict:
+    samples = []
+
+    for _ in range(repeat):
+        for user_id in user_ids:
+            start = time.perf_counter()
+            await manager.fetch_user_access(user_id)
+            samples.append(time.perf_counter() - start)
+
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99)] * 1e6,
+    }
+
+
+async def measure_many(manager: BaseRBACManager, user_ids: list[int], repeat: int) -> float:
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await manager.fetch_many_user_access(user_ids)
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1e6
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        await Tortoise.init(db_url=f"sqlite://{os.path.join(directory, 'rbac.db')}", modules={"entities": ["entities.users", "entities.permissions"]})
+
+        try:
+            await Tortoise.generate_schemas()
+            await apply_indexes(PermissionEntity, UserRoles)  # Already created from Meta.indexes, must be a no-op
+            await seed(rng, args.users, args.roles, args.roles_per_user, args.role_permissions, args.scoped_permissions)
+
+            sequential, reference = SequentialManager(), ReferenceManager()
+            sample = rng.sample(range(1, args.users + 1), min(args.sample, args.users))
+
+            for user_id in sample[:20]:
+                if normalized(await sequential.fetch_user_access(user_id)) != normalized(await reference.fetch_user_access(user_id)):
+                    raise AssertionError(f"Managers returned different access for user {user_id}")
+
+            results: dict[str, Any] = {"seed": vars(args), "fetch_user_access": {}, "fetch_many_user_access_100_us": {}}
+
+            for name, manager in (("sequential", sequential), ("reference", reference)):
+                await measure(manager, sample[:10], 1)  # Warm up
+                results["fetch_user_access"][name] = await measure(manager, sample, args.repeat)
+                results["fetch_many_user_access_100_us"][name] = await measure_many(manager, sample[:100], args.repeat)
+        finally:
+            await Tortoise.close_connections()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--roles", type=int, default=50)
+    parser.add_argument("--roles-per-user", type=int, default=3)
+    parser.add_argument("--role-permissions", type=int, default=50)
+    parser.add_argument("--scoped-permissions", type=int, default=20)
+    parser.add_argument("--sample", type=int, default=200, help="Users to fetch in every repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    for name, stats in results["fetch_user_access"].items():
+        print(f"{name:>10}: fetch_user_access mean={stats['mean_us']:.0f}us p50={stats['p50_us']:.0f}us p99={stats['p99_us']:.0f}us, "
+              f"fetch_many_user_access(100)={results['fetch_many_user_access_100_us'][name]:.0f}us", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from tortoise import Model
 from tortoise import fields
+from tortoise.indexes import Index
 
 from undore_rbac.interfaces.permissions import IRBACPermission, IRBACRole
 
@@ -19,6 +20,11 @@ class PermissionEntity(Model):
 
     class Meta:
         table = 'permissions'
+        # Used by TortoiseRBACManager, same as undore_rbac.managers.tortoise_migrations.INDEXES
+        indexes = (
+            Index(fields=("user_id", "created_at"), name="idx_rbac_permissions_user"),
+            Index(fields=("role_id", "created_at"), name="idx_rbac_permissions_role"),
+        )
 
     def to_interface(self) -> IRBACPermission:
         return IRBACPermission(
@@ -27,7 +33,8 @@ class PermissionEntity(Model):
             user_id=str(self.user_id) if self.user_id else None,
             role_id=str(self.role_id) if self.role else None,
             value=self.value,
-            created_at=self.created_at
+            created_at=self.created_at,
+            expires_at=self.expires_at
         )
 
 
@@ -56,3 +63,4 @@ class UserRoles(Model):
 
     class Meta:
         table = 'user_roles'
+        indexes = (Index(fields=("user_id", "role_id"), name="idx_rbac_user_roles_user"),)
@@ -1,30 +1,41 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any, TypedDict, Optional
+from typing import Any, TypedDict, Optional, Sequence
 
+import jwt
 from starlette.requests import Request
+from typing_extensions import NotRequired
 
-from undore_rbac.interfaces.permissions import IRBACPermission, IRBACRole
+from undore_rbac.interfaces.permissions import IRBACPermission, IRBACRole, PermissionRecord, RoleRecord
 
 class Access(TypedDict):
-    permissions: list[IRBACPermission]
-    roles: list[IRBACRole]
+    permissions: list[IRBACPermission | PermissionRecord | tuple]  # Records and plain tuples skip pydantic validation, see PermissionRecord
+    roles: list[IRBACRole | RoleRecord | tuple]
     user: Any | None  # Optional: not used within UndoreRBAC, but can be utilized to save requests
+    version: NotRequired[Any]  # Optional: stamp, which changes whenever this access changes. See BaseRBACManager.fetch_access_version
 
 class BaseRBACManager(ABC):
     """
     Base class for RBAC custom manager.
     See /shared/custom_rbac_manager.py for example
+
+    fetch_many_concurrency: Maximum amount of concurrent fetch_user_access calls in the default fetch_many_user_access
+    negative_cache_exceptions: Exceptions of authorize, which mean the token is invalid. Cached for a short time, if enabled in RBACAuthorizationCacheConfig.
+    Other exceptions (for example, an identity service being unavailable) are never cached.
+    Add only exceptions specific to invalid tokens: a plain HTTPException would cache a 503 as well
     """
+    fetch_many_concurrency: int = 10
+    negative_cache_exceptions: tuple[type[BaseException], ...] = (jwt.InvalidTokenError,)
 
     @abstractmethod
     async def authorize(self, token: str, request: Optional[Request] = None, custom_meta: Optional[dict] = None) -> Any:
         """
         Decode authentication token and return user id
 
-        WARNING: Please take into account, that custom_meta can be None, because it is NOT passed when requesting authorization
-        internally, like in the RBAC Exception Handler.
+        WARNING: Please take into account, that custom_meta can be None
 
-        If you REALLY need to carry the custom_meta in the exception authorization, you can use request.state
+        RBACGuard stores the result in request.state.rbac_user_id (and the gate in request.state.rbac_gate),
+        so the RBAC Exception Handler and your endpoints do not need to authorize the token again
 
         :param token: Authentication token
         :param request: Optional. Always provided from RBAC internally and can be used to avoid race conditions
@@ -48,3 +59,40 @@ class BaseRBACManager(ABC):
         :return: Access object
         """
         ...
+
+    async def fetch_many_user_access(self, user_ids: Sequence[Any], custom_meta: Optional[dict] = None) -> dict[Any, Access]:
+        """
+        Fetch access of many users at once. Used by RbacService.check_access_many
+
+        Optional: by default calls fetch_user_access for every user, at most fetch_many_concurrency at a time.
+        Override it to fetch everything in one batched query
+
+        :param user_ids: User IDs To fetch permissions and roles for
+        :param custom_meta: Optional. Custom meta dict, can be passed when creating an RBACGate for flexibility
+        :return: Dict of [userId, Access]. Must contain every requested user
+        """
+        semaphore = asyncio.Semaphore(self.fetch_many_concurrency)
+
+        async def fetch(user_id: Any) -> Access:
+            async with semaphore:
+                return await self.fetch_user_access(user_id, custom_meta=custom_meta)
+
+        accesses = await asyncio.gather(*(fetch(i) for i in user_ids))
+        return dict(zip(user_ids, accesses))
+
+    async def fetch_access_version(self, user_id: Any, custom_meta: Optional[dict] = None) -> Any:
+        """
+        Fetch only the version of users' access: a cheap stamp, which changes whenever users' permissions, roles or permissions of users' roles change.
+        For example, a sum of per-user and per-role change counters, or max(updated_at) of these rows.
+        Must be the same value, that fetch_user_access returns in Access['version'].
+        Versions are compared in their JSON form, values other than JSON types (datetime, UUID, Decimal) as str(),
+        because a shared cache backend stores Access['version'] as JSON (see RedisCacheBackend)
+
+        Optional: used to revalidate cached access (see RBACCacheConfig.revalidate_after), so it is only fetched again if it changed.
+        By default returns None, which means versions are not supported and access is always fetched again
+
+        :param user_id: User ID To fetch access version for
+        :param custom_meta: Optional. Custom meta dict, can be passed when creating an RBACGate for flexibility
+        :return: Access version, or None if it is unknown
+        """
+        return None
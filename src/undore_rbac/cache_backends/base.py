@@ -0,0 +1,99 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Sequence
+
+from undore_rbac.base_manager import Access
+from undore_rbac.utils.ttl_cache import CacheStats
+
+
+class BaseCacheBackend(ABC):
+    """
+    Storage of Access, fetched by the RBAC Manager (see RBACCacheConfig.backend).
+    Entries are keyed by user id and custom_meta.
+
+    MemoryCacheBackend keeps them in the worker process, RedisCacheBackend shares them between workers.
+    Implement this class to use another storage
+    """
+
+    async def start(self) -> None:
+        """
+        Called on application startup. For example, to subscribe to invalidations of other workers
+        """
+
+    async def close(self) -> None:
+        """
+        Called on application shutdown
+        """
+
+    @abstractmethod
+    async def get(self, user_id: Any, custom_meta: dict | None) -> Access | None:
+        """
+        :return: Cached Access, or None if it is missing or expired
+        """
+        ...
+
+    async def get_many(self, user_ids: Sequence[Any], custom_meta: dict | None) -> dict[Any, Access]:
+        """
+        Optional: by default calls get for every user. Override it to fetch everything in one round trip
+
+        :return: Dict of [userId, Access] of cached users only
+        """
+        result = {}
+
+        for user_id in user_ids:
+            if (access := await self.get(user_id, custom_meta)) is not None:
+                result[user_id] = access
+
+        return result
+
+    @abstractmethod
+    async def set(self, user_id: Any, custom_meta: dict | None, access: Access, ttl: float | None = None) -> None:
+        """
+        :param ttl: Optional. Maximum lifetime of this entry in seconds, for example until the earliest permission expiry.
+        Default lifetime of the backend is used, if it is shorter
+        """
+        ...
+
+    async def set_many(self, accesses: dict[Any, Access], custom_meta: dict | None, ttls: dict[Any, float] | None = None) -> None:
+        """
+        Optional: by default calls set for every user concurrently. Override it to store everything in one round trip
+
+        :param accesses: Dict of [userId, Access]
+        :param ttls: Optional. Dict of [userId, ttl] for users, whose entries must not live longer than their ttl (see set)
+        """
+        ttls = ttls or {}
+        await asyncio.gather(*(self.set(user_id, custom_meta, access, ttl=ttls.get(user_id)) for user_id, access in accesses.items()))
+
+    @abstractmethod
+    async def invalidate_user(self, user_id: Any) -> None:
+        """
+        Drop cached access of a user for every custom_meta
+        """
+        ...
+
+    @abstractmethod
+    async def invalidate_role(self, role_id: Any) -> None:
+        """
+        Drop cached access of every user, who has a role
+        """
+        ...
+
+    @abstractmethod
+    async def invalidate_all(self) -> None:
+        ...
+
+    @staticmethod
+    def lifetime(default: float | None, ttl: float | None) -> float | None:
+        """
+        Shorter of the default lifetime and the one passed to set. None means forever
+        """
+        if ttl is None or (default is not None and default < ttl):
+            return default
+        return ttl
+
+    @property
+    def stats(self) -> CacheStats | None:
+        """
+        Optional: hit, miss and eviction counters of this worker
+        """
+        return None
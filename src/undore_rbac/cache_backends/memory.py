@@ -0,0 +1,48 @@
+from typing import Any
+
+from undore_rbac.base_manager import Access
+from undore_rbac.cache_backends.base import BaseCacheBackend
+from undore_rbac.interfaces.permissions import as_role_record
+from undore_rbac.utils.freeze import freeze
+from undore_rbac.utils.ttl_cache import TTLCache, CacheStats
+
+
+class MemoryCacheBackend(BaseCacheBackend):
+    """
+    In-process cache backend. Every worker has its own cache, invalidations only affect the current worker
+    """
+    def __init__(self, max_size: int = 10_000, ttl: float | None = 30.0):
+        """
+        :param max_size: Maximum amount of cached users (per custom_meta). Least recently used ones are evicted first
+        :param ttl: Lifetime of a cached Access in seconds
+        """
+        self.cache = TTLCache(max_size, ttl)
+
+    async def get(self, user_id: Any, custom_meta: dict | None) -> Access | None:
+        return self.cache.get((user_id, freeze(custom_meta)))
+
+    async def set(self, user_id: Any, custom_meta: dict | None, access: Access, ttl: float | None = None) -> None:
+        self.cache.set((user_id, freeze(custom_meta)), access, ttl=self.lifetime(self.cache.ttl, ttl))
+
+    async def set_many(self, accesses: dict[Any, Access], custom_meta: dict | None, ttls: dict[Any, float] | None = None) -> None:
+        frozen, ttls = freeze(custom_meta), ttls or {}
+
+        for user_id, access in accesses.items():
+            self.cache.set((user_id, frozen), access, ttl=self.lifetime(self.cache.ttl, ttls.get(user_id)))
+
+    async def invalidate_user(self, user_id: Any) -> None:
+        for key, _ in self.cache.items():
+            if key[0] == user_id:
+                self.cache.pop(key)
+
+    async def invalidate_role(self, role_id: Any) -> None:
+        for key, access in self.cache.items():
+            if any(as_role_record(role).id == role_id for role in access['roles']):
+                self.cache.pop(key)
+
+    async def invalidate_all(self) -> None:
+        self.cache.clear()
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.cache.stats
@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Sequence
+
+from undore_rbac.base_manager import Access
+from undore_rbac.cache_backends.base import BaseCacheBackend
+from undore_rbac.interfaces.permissions import PermissionRecord, RoleRecord, as_permission_record, as_role_record
+from undore_rbac.utils.freeze import freeze
+from undore_rbac.utils.ttl_cache import TTLCache, CacheStats
+
+
+class RedisCacheBackend(BaseCacheBackend):
+    """
+    Cache backend, shared between workers (and servers) through Redis.
+    Works with any client, which implements the redis.asyncio.Redis interface (for example, fakeredis.FakeAsyncRedis in tests).
+    redis itself is not a dependency of UndoreRBAC, install it yourself
+
+    Access is stored as compact JSON (permission and role rows, see PermissionRecord and RoleRecord), next to indexes of cache keys by user and by role,
+    so invalidate_user and invalidate_role only delete affected entries.
+
+    Every worker can also keep a small local cache in front of Redis (see local_ttl).
+    Invalidations are published over Redis pub/sub and applied to local caches of every worker, so a revoked permission takes effect
+    everywhere right away, and in local_ttl seconds at worst (for example, if a worker was disconnected from Redis)
+
+    custom user objects (Access['user']) are not stored by default, override dump_user and load_user to store them.
+    Access['version'] is stored as JSON, values other than JSON types (for example, datetime) as str() (see BaseRBACManager.fetch_access_version)
+    """
+    def __init__(self, client: Any, ttl: float | None = 30.0, prefix: str = "undore_rbac:", local_ttl: float = 1.0, local_max_size: int = 10_000):
+        """
+        :param client: redis.asyncio.Redis client
+        :param ttl: Lifetime of a cached Access in seconds
+        :param prefix: Prefix of every key and of the invalidation channel
+        :param local_ttl: Lifetime of an entry in the local cache of a worker in seconds. 0 disables local cache (and pub/sub)
+        :param local_max_size: Maximum amount of entries in the local cache of a worker
+        """
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.channel = f"{prefix}invalidations"
+
+        self.local: TTLCache | None = TTLCache(local_max_size, local_ttl) if local_ttl > 0 else None
+        self.hits = 0
+        self.misses = 0
+
+        self.__pubsub: Any = None
+        self.__listener: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self.local is None or self.__listener is not None:
+            return
+
+        self.__pubsub = self.client.pubsub()
+        await self.__pubsub.subscribe(self.channel)
+        self.__listener = asyncio.create_task(self.__listen())
+
+    async def close(self) -> None:
+        if self.__listener is not None:
+            self.__listener.cancel()
+            try:
+                await self.__listener
+            except asyncio.CancelledError:
+                pass
+            self.__listener = None
+
+        if self.__pubsub is not None:
+            await self.__pubsub.unsubscribe(self.channel)
+            await (self.__pubsub.aclose() if hasattr(self.__pubsub, "aclose") else self.__pubsub.close())
+            self.__pubsub = None
+
+    async def get(self, user_id: Any, custom_meta: dict | None) -> Access | None:
+        local_key = user_id, freeze(custom_meta)
+
+        if self.local is not None and (access := self.local.get(local_key)) is not None:
+            self.hits += 1
+            return access
+
+        data = await self.client.get(self.__access_key(user_id, custom_meta))
+        return self.__loaded(local_key, data)
+
+    async def get_many(self, user_ids: Sequence[Any], custom_meta: dict | None) -> dict[Any, Access]:
+        result = {}
+        missing = []
+
+        for user_id in user_ids:
+            if self.local is not None and (access := self.local.get((user_id, freeze(custom_meta)))) is not None:
+                self.hits += 1
+                result[user_id] = access
+            else:
+                missing.append(user_id)
+
+        if missing:
+            values = await self.client.mget([self.__access_key(i, custom_meta) for i in missing])
+
+            for user_id, data in zip(missing, values):
+                if (access := self.__loaded((user_id, freeze(custom_meta)), data)) is not None:
+                    result[user_id] = access
+
+        return result
+
+    async def set(self, user_id: Any, custom_meta: dict | None, access: Access, ttl: float | None = None) -> None:
+        await self.set_many({user_id: access}, custom_meta, {user_id: ttl} if ttl is not None else None)
+
+    async def set_many(self, accesses: dict[Any, Access], custom_meta: dict | None, ttls: dict[Any, float] | None = None) -> None:
+        """
+        Every entry and its indexes are written in one pipeline
+        """
+        ttls = ttls or {}
+        lifetimes = {user_id: self.lifetime(self.ttl, ttls.get(user_id)) for user_id in accesses}
+        # Indexes are shared by entries with different ttls, so they live as long as the longest one can
+        index_ttl = _milliseconds(self.ttl)
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id, access in accesses.items():
+                key = self.__access_key(user_id, custom_meta)
+                pipe.set(key, self.dump(access), px=_milliseconds(lifetimes[user_id]))
+
+                for index in (self.__user_key(user_id), *(self.__role_key(as_role_record(i).id) for i in access['roles'])):
+                    pipe.sadd(index, key)
+                    if index_ttl:
+                        pipe.pexpire(index, index_ttl)
+
+            await pipe.execute()
+
+        if self.local is not None:
+            frozen = freeze(custom_meta)
+
+            for user_id, access in accesses.items():
+                self.local.set((user_id, frozen), access, ttl=self.lifetime(self.local.ttl, lifetimes[user_id]))
+
+    async def invalidate_user(self, user_id: Any) -> None:
+        await self.__delete_index(self.__user_key(user_id))
+        await self.__publish({"op": "user", "id": user_id})
+
+    async def invalidate_role(self, role_id: Any) -> None:
+        await self.__delete_index(self.__role_key(role_id))
+        await self.__publish({"op": "role", "id": role_id})
+
+    async def invalidate_all(self) -> None:
+        keys = [key async for key in self.client.scan_iter(match=f"{self.prefix}*")]
+
+        for i in range(0, len(keys), 500):
+            await self.client.delete(*keys[i:i + 500])
+
+        await self.__publish({"op": "all"})
+
+    @property
+    def stats(self) -> CacheStats:
+        local = self.local.stats if self.local is not None else None
+
+        return CacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=local.evictions if local else 0,
+            expirations=local.expirations if local else 0,
+            size=local.size if local else 0,
+            max_size=local.max_size if local else 0
+        )
+
+    def dump(self, access: Access) -> bytes:
+        """
+        Serialize Access: {"p": [permission rows], "r": [role rows], "u": user, "v": version}
+        """
+        return json.dumps({
+            "p": [
+                [i.id, i.permission, i.user_id, i.role_id, i.value, i.created_at.isoformat(), i.expires_at.isoformat() if i.expires_at else None]
+                for i in map(as_permission_record, access['permissions'])
+            ],
+            "r": [[i.id, i.priority, getattr(i, "version", None)] for i in map(as_role_record, access['roles'])],
+            "u": self.dump_user(access['user']),
+            "v": access.get('version')
+        }, separators=(",", ":"), default=str).encode()
+
+    def load(self, data: bytes | str) -> Access:
+        value = json.loads(data)
+        access: Access = {
+            "permissions": [
+                PermissionRecord(*row[:5], datetime.fromisoformat(row[5]), datetime.fromisoformat(row[6]) if len(row) > 6 and row[6] else None)
+                for row in value["p"]
+            ],
+            "roles": [RoleRecord(*row) for row in value["r"]],
+            "user": self.load_user(value["u"])
+        }
+
+        if value.get("v") is not None:
+            access['version'] = value["v"]
+
+        return access
+
+    def dump_user(self, user: Any) -> Any:
+        """
+        JSON-serializable representation of Access['user']. Not stored by default
+        """
+        return None
+
+    def load_user(self, data: Any) -> Any:
+        """
+        Access['user'] from the value returned by dump_user
+        """
+        return data
+
+    def __loaded(self, local_key: tuple, data: bytes | str | None) -> Access | None:
+        if data is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        access = self.load(data)
+
+        if self.local is not None:
+            self.local.set(local_key, access)
+
+        return access
+
+    async def __delete_index(self, index: str) -> None:
+        keys = await self.client.smembers(index)
+        await self.client.delete(index, *keys)
+
+    async def __publish(self, message: dict) -> None:
+        if self.local is not None:
+            self.__apply(message)
+
+        await self.client.publish(self.channel, json.dumps(message, default=str))
+
+    async def __listen(self) -> None:
+        while True:
+            try:
+                async for message in self.__pubsub.listen():
+                    if message.get("type") == "message":
+                        self.__apply(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Invalidations could be missed while disconnected, local cache can not be trusted anymore
+                self.local.clear()
+                await asyncio.sleep(1)
+
+    def __apply(self, message: dict) -> None:
+        # Ids went through JSON (a UUID arrives as a string), so they are compared in the same form on both sides
+        if message.get("op") == "user":
+            user_id = _json_key(message["id"])
+
+            for key, _ in self.local.items():
+                if _json_key(key[0]) == user_id:
+                    self.local.pop(key)
+        elif message.get("op") == "role":
+            role_id = _json_key(message["id"])
+
+            for key, access in self.local.items():
+                if any(_json_key(as_role_record(role).id) == role_id for role in access['roles']):
+                    self.local.pop(key)
+        else:
+            self.local.clear()
+
+    def __access_key(self, user_id: Any, custom_meta: dict | None) -> str:
+        meta = hashlib.sha256(json.dumps(custom_meta, sort_keys=True, default=str).encode()).hexdigest()[:16] if custom_meta else "-"
+        return f"{self.prefix}access:{_json_key(user_id)}:{meta}"
+
+    def __user_key(self, user_id: Any) -> str:
+        return f"{self.prefix}user:{_json_key(user_id)}"
+
+    def __role_key(self, role_id: Any) -> str:
+        return f"{self.prefix}role:{_json_key(role_id)}"
+
+
+def _milliseconds(seconds: float | None) -> int | None:
+    return max(int(seconds * 1000), 1) if seconds is not None else None
+
+
+def _json_key(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
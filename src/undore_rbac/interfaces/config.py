@@ -3,6 +3,8 @@ from typing import Literal, Optional, TypedDict
 from pydantic import BaseModel, field_validator
 
 from undore_rbac.base_manager import BaseRBACManager
+from undore_rbac.cache_backends.base import BaseCacheBackend
+from undore_rbac.utils.metrics import DEFAULT_BUCKETS
 
 class RBACExceptionHandlerConfig(BaseModel):
     """
@@ -16,22 +18,89 @@ class RBACExceptionHandlerConfig(BaseModel):
     enable_usage_warning: bool = True
     expose_missing_permission: bool = True
 
+class RBACCacheConfig(BaseModel):
+    """
+    Part of RBACConfig
+
+    use: If True, Access fetched by the RBAC Manager is cached in RbacService. See RbacService.invalidate_* for invalidation
+    max_size: Maximum amount of cached users (per custom_meta). Least recently used ones are evicted first
+    ttl: Lifetime of a cached Access in seconds
+    single_flight: If True, concurrent fetches of the same user (and custom_meta) share one RBAC Manager call. Works even if use is False
+    role_layers_max_size: Maximum amount of compiled roles, shared between users. Used regardless of use
+    revalidate_after: If set, cached Access older than this amount of seconds is checked with rbac_manager.fetch_access_version before use,
+    and fetched again only if its version changed (see Access['version']). Revalidated entries are cached for another ttl, so ttl can be a lot longer then
+    backend: Where cached Access is stored. In worker memory by default (MemoryCacheBackend with max_size and ttl).
+    Use RedisCacheBackend to share the cache and invalidations between workers. max_size and ttl are ignored then
+    """
+    use: bool = False
+    max_size: int = 10_000
+    ttl: float = 30.0
+    single_flight: bool = True
+    role_layers_max_size: int = 1024
+    revalidate_after: Optional[float] = None
+    backend: Optional[BaseCacheBackend] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+class RBACAuthorizationCacheConfig(BaseModel):
+    """
+    Part of RBACConfig
+
+    use: If True, RbacService.authorize caches user ids, returned by rbac_manager.authorize, by token hash
+    max_size: Maximum amount of cached tokens. Least recently used ones are evicted first
+    ttl: Maximum lifetime of a cached user id in seconds. JWT tokens are never cached past their exp claim
+    negative_ttl: Lifetime of a cached authorization failure in seconds (see BaseRBACManager.negative_cache_exceptions). 0 disables negative caching
+    """
+    use: bool = False
+    max_size: int = 10_000
+    ttl: float = 60.0
+    negative_ttl: float = 5.0
+
+class RBACMetricsConfig(BaseModel):
+    """
+    Part of RBACConfig
+
+    use: If True, RBACGuard records duration of every authorization phase and access decisions. See RbacService.metrics and RbacService.export_metrics
+    buckets: Phase duration histogram buckets in seconds
+    track_permissions: Count access decisions per permission. If False, only granted and denied totals are counted
+    slow_check_threshold: If set, RBACGuard checks slower than this amount of seconds are logged as warnings with phase durations. Works even if use is False
+    """
+    use: bool = False
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    track_permissions: bool = True
+    slow_check_threshold: Optional[float] = None
+
 class RBACConfig(BaseModel):
     """
     Config for Undore RBAC
     Used in RbacModule.for_root
 
-    rbac_map_path: Absolute path to rbac map YAML file
+    rbac_map_path: Absolute path to rbac map YAML file, or to a folder of namespace YAML files (for example, users.yml, orders.yml)
+    rbac_map_lazy_loading: Only for folder maps. Load a namespace file on first use instead of application startup
+    rbac_map_cache_path: Optional absolute path to a compiled rbac map cache file. Speeds up startup, while rbac map is unchanged
     rbac_manager: RBAC Manager INSTANCE. Must be a subclass of BaseRBACManager
     log_level: RBAC Logging level
+    log_mode: rich - colored output for development. plain or json - plain text or JSON lines without rich, cheaper for production
+    log_granted_sample_rate: Fraction (0-1) of "Access granted" messages to log. Denied and slow checks are always logged
     log_level: See RBACExceptionHandlerConfig for details
     require_sorted_permissions: Require all IRBACPermission objects provided in a permission check to be sorted by CREATED_AT
+    access_cache_config: See RBACCacheConfig for details
+    authorization_cache_config: See RBACAuthorizationCacheConfig for details
+    metrics_config: See RBACMetricsConfig for details
     """
     rbac_map_path: str
+    rbac_map_lazy_loading: bool = False
+    rbac_map_cache_path: Optional[str] = None
     rbac_manager: BaseRBACManager
     log_level: Optional[Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]] = "DEBUG"
+    log_mode: Literal["rich", "plain", "json"] = "rich"
+    log_granted_sample_rate: float = 1.0
     exception_handler_config: RBACExceptionHandlerConfig = RBACExceptionHandlerConfig()
     require_sorted_permissions: bool = True  # Disabling this will not raise an exception if permissions are not sorted by created_at for priority
+    access_cache_config: RBACCacheConfig = RBACCacheConfig()
+    authorization_cache_config: RBACAuthorizationCacheConfig = RBACAuthorizationCacheConfig()
+    metrics_config: RBACMetricsConfig = RBACMetricsConfig()
 
     @field_validator('rbac_manager')
     def validate_rbac_manager(cls, v):
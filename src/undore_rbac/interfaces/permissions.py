@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Optional, Any
+from datetime import datetime, timezone
+from typing import Optional, Any, NamedTuple
 
 from pydantic import BaseModel
 
@@ -53,8 +53,58 @@ class IRBACPermission(BaseModel):
     role_id: Optional[Any] = None
     value: bool
     created_at: datetime
+    expires_at: Optional[datetime] = None  # Optional: permission is ignored from this moment. Naive datetimes are treated as UTC
 
 
 class IRBACRole(BaseModel):
     id: Any
     priority: int
+    version: Optional[Any] = None  # Optional: changes whenever role permissions change. Speeds up role layers caching
+
+
+class PermissionRecord(NamedTuple):
+    """
+    Lightweight alternative to IRBACPermission, which is not validated. Use it in RBAC Managers, which fetch many permissions
+
+    RBACGate also accepts plain tuples in the same column order (for example, rows of a raw SQL query):
+    (id, permission, user_id, role_id, value, created_at) or (id, permission, user_id, role_id, value, created_at, expires_at)
+    """
+    id: Any
+    permission: str
+    user_id: Any
+    role_id: Any
+    value: bool
+    created_at: datetime
+    expires_at: datetime | None = None
+
+
+class RoleRecord(NamedTuple):
+    """
+    Lightweight alternative to IRBACRole, which is not validated
+
+    RBACGate also accepts plain tuples in the same column order: (id, priority) or (id, priority, version)
+    """
+    id: Any
+    priority: int
+    version: Any = None
+
+
+def as_permission_record(permission: IRBACPermission | PermissionRecord | tuple) -> IRBACPermission | PermissionRecord:
+    """
+    Convert a plain tuple row to PermissionRecord. IRBACPermission and records are returned as is
+    """
+    return PermissionRecord(*permission) if type(permission) is tuple else permission
+
+
+def as_role_record(role: IRBACRole | RoleRecord | tuple) -> IRBACRole | RoleRecord:
+    """
+    Convert a plain tuple row to RoleRecord. IRBACRole and records are returned as is
+    """
+    return RoleRecord(*role) if type(role) is tuple else role
+
+
+def expiry_timestamp(expires_at: datetime) -> float:
+    """
+    Permission expiry as a unix timestamp. Naive datetimes are treated as UTC
+    """
+    return (expires_at if expires_at.tzinfo is not None else expires_at.replace(tzinfo=timezone.utc)).timestamp()
@@ -1,11 +1,80 @@
+import json
 import logging
 from typing import Literal, cast
 
 import click
 from rich.logging import RichHandler
+from rich.text import Text
 
+LogMode = Literal["rich", "plain", "json"]
+
+
+def strip_markup(message: str) -> str:
+    """
+    Remove rich markup (for example, [green]) from a log message
+    """
+    if "[" not in message:
+        return message
+
+    try:
+        return Text.from_markup(message).plain
+    except Exception:  # Not valid markup, for example brackets in a user id
+        return message
+
+
+class PlainFormatter(logging.Formatter):
+    """
+    Rich markup free formatter for production logs
+    """
+    def __init__(self):
+        super().__init__(fmt="%(asctime)s %(levelname)s [RBAC] %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = _plain_message(record)
+        return super().formatMessage(record)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record, without rich markup. Extra fields passed to a log call (for example, user_id) are included
+    """
+    reserved = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": "undore_rbac",
+            "message": _plain_message(record),
+        }
+        data.update((k, v) for k, v in record.__dict__.items() if k not in self.reserved)
+
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str)
+
+
+def _plain_message(record: logging.LogRecord) -> str:
+    # Markup is only stripped from the message template, so brackets in arguments (for example, in a user id) are kept
+    message = strip_markup(str(record.msg))
+    return message % record.args if record.args else message
+
+
+def init_logger(level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] | None, mode: LogMode = "rich"):
+    """
+    :param level: RBAC Logging level
+    :param mode: rich - colored RichHandler output (development), plain - plain text lines, json - one JSON object per line.
+    plain and json skip rich rendering, which is a lot cheaper for production
+    """
+    if mode != "rich":
+        handler = logging.StreamHandler()
+        handler.setFormatter(PlainFormatter() if mode == "plain" else JSONFormatter())
+
+        logger = logging.Logger("[RBAC]", level=cast(str, level))
+        logger.addHandler(handler)
+        return logger
 
-def init_logger(level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] | None):
     logging.basicConfig(
         level=level,
         format='',
@@ -0,0 +1,162 @@
+from datetime import datetime
+from typing import Any, Optional, Sequence, Type
+
+from tortoise import Model, timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from undore_rbac.base_manager import BaseRBACManager, Access
+from undore_rbac.interfaces.permissions import PermissionRecord, RoleRecord
+
+
+class TortoiseRBACManager(BaseRBACManager):
+    """
+    Reference RBAC Manager for Tortoise ORM. authorize is left for you to implement.
+
+    Roles of users, permissions of these roles and scoped permissions of users are fetched in ONE query
+    (no ORM models are created, only the needed columns are selected), expired permissions are filtered out by the database.
+    fetch_many_user_access fetches any amount of users with the same single query.
+
+    Models must have these fields (see /entities/permissions.py for example):
+    - permission_model: id, permission, user (FK or user_id), role (FK or role_id), value, expires_at (nullable), created_at
+    - role_model: id, priority
+    - user_role_model: user (FK or user_id), role (FK or role_id)
+
+    Create indexes, which this query relies on, with undore_rbac.managers.tortoise_migrations.apply_indexes
+    (or declare them in Meta.indexes of your models, see /entities/permissions.py)
+    """
+    def __init__(self, permission_model: Type[Model], role_model: Type[Model], user_role_model: Type[Model]):
+        """
+        :param permission_model: Permission Tortoise model
+        :param role_model: Role Tortoise model
+        :param user_role_model: Many-to-many model of users and roles
+        """
+        self.permission_model = permission_model
+        self.role_model = role_model
+        self.user_role_model = user_role_model
+
+        self.__queries: dict[tuple[str, int], str] = {}  # (dialect, user count) -> SQL
+
+    async def fetch_user_access(self, user_id: Any, custom_meta: Optional[dict] = None) -> Access:
+        return (await self.fetch_many_user_access([user_id], custom_meta=custom_meta))[user_id]
+
+    async def fetch_many_user_access(self, user_ids: Sequence[Any], custom_meta: Optional[dict] = None) -> dict[Any, Access]:
+        result: dict[Any, Access] = {user_id: {"permissions": [], "roles": [], "user": None} for user_id in user_ids}
+        if not result:
+            return result
+
+        connection = self.connection
+        # Ids are compared with database values, which are not strings for integer primary keys
+        owners = {self.__db_id(user_id): user_id for user_id in result}
+        now = self.permission_model._meta.fields_map["expires_at"].to_db_value(timezone.now(), self.permission_model)
+
+        rows = await connection.execute_query_dict(self.__query(connection.capabilities.dialect, len(owners)), [*owners, *owners, now, *owners, now])
+
+        for row in rows:
+            access = result[owners[row["owner_id"]]]
+
+            if row["kind"] == 0:
+                access["roles"].append(RoleRecord(row["id"], row["priority"]))
+            else:
+                access["permissions"].append(PermissionRecord(
+                    row["id"], row["permission"], row["user_id"], row["role_id"], bool(row["value"]), _datetime(row["created_at"]), _datetime(row["expires_at"])
+                ))
+
+        return result
+
+    @property
+    def connection(self) -> BaseDBAsyncClient:
+        return self.permission_model._meta.db
+
+    def __db_id(self, user_id: Any) -> Any:
+        field = self.user_role_model._meta.fields_map[_field(self.user_role_model, "user")]
+        return field.to_python_value(user_id) if isinstance(user_id, str) else user_id
+
+    def __query(self, dialect: str, user_count: int) -> str:
+        """
+        Roles (kind 0) and permissions (kind 1) of users in one UNION ALL query, newest permissions first.
+        Rows of every user are marked with owner_id, role permissions are joined through user roles
+        """
+        if (query := self.__queries.get((dialect, user_count))) is not None:
+            return query
+
+        placeholders = _Placeholders(dialect)
+
+        p = _Columns(self.permission_model)
+        r = _Columns(self.role_model)
+        ur = _Columns(self.user_role_model)
+
+        permission_columns = (f"p.{p.id} AS id, NULL AS priority, p.{p.permission} AS permission, p.{p.user} AS user_id, p.{p.role} AS role_id, "
+                              f"p.{p.value} AS value, p.{p.created_at} AS created_at, p.{p.expires_at} AS expires_at")
+
+        def not_expired() -> str:
+            return f"(p.{p.expires_at} IS NULL OR p.{p.expires_at} > {placeholders.take(1)})"
+
+        query = (
+            f"SELECT 0 AS kind, ur.{ur.user} AS owner_id, r.{r.id} AS id, r.{r.priority} AS priority, NULL AS permission, NULL AS user_id, "
+            f"NULL AS role_id, NULL AS value, NULL AS created_at, NULL AS expires_at "
+            f"FROM {ur.table} ur JOIN {r.table} r ON r.{r.id} = ur.{ur.role} "
+            f"WHERE ur.{ur.user} IN ({placeholders.take(user_count)}) "
+            f"UNION ALL "
+            f"SELECT 1, ur.{ur.user}, {permission_columns} "
+            f"FROM {ur.table} ur JOIN {p.table} p ON p.{p.role} = ur.{ur.role} "
+            f"WHERE ur.{ur.user} IN ({placeholders.take(user_count)}) AND {not_expired()} "
+            f"UNION ALL "
+            f"SELECT 1, p.{p.user}, {permission_columns} "
+            f"FROM {p.table} p "
+            f"WHERE p.{p.user} IN ({placeholders.take(user_count)}) AND {not_expired()} "
+            f"ORDER BY kind, created_at DESC"
+        )
+
+        # Only a few distinct batch sizes are used in practice
+        if len(self.__queries) < 64:
+            self.__queries[dialect, user_count] = query
+
+        return query
+
+
+def _datetime(value: datetime | str | None) -> datetime | None:
+    # SQLite returns datetimes as text
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _field(model: Type[Model], name: str) -> str:
+    """
+    Field name of a column, foreign keys are resolved to their id fields (user -> user_id)
+    """
+    if name in model._meta.fk_fields:
+        return model._meta.fields_map[name].source_field
+
+    return name
+
+
+class _Columns:
+    """
+    Table and column names of a model, for raw SQL
+    """
+    def __init__(self, model: Type[Model]):
+        self.table = model._meta.db_table
+        self.__projection = model._meta.fields_db_projection
+        self.__model = model
+
+    def __getattr__(self, name: str) -> str:
+        return self.__projection[_field(self.__model, name)]
+
+
+class _Placeholders:
+    """
+    Query parameter placeholders of a database dialect, numbered in order of appearance
+    """
+    def __init__(self, dialect: str):
+        self.dialect = dialect
+        self.count = 0
+
+    def take(self, amount: int) -> str:
+        if self.dialect == "postgres":
+            result = ", ".join(f"${self.count + i + 1}" for i in range(amount))
+        elif self.dialect == "mysql":
+            result = ", ".join(["%s"] * amount)
+        else:
+            result = ", ".join(["?"] * amount)
+
+        self.count += amount
+        return result
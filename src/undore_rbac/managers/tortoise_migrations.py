@@ -0,0 +1,68 @@
+from typing import Type
+
+from tortoise import Model
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from undore_rbac.managers.tortoise_manager import _Columns
+
+# (model, index name, fields), model is "permission" or "user_role" (see TortoiseRBACManager)
+INDEXES: tuple[tuple[str, str, tuple[str, ...]], ...] = (
+    ("permission", "idx_rbac_permissions_user", ("user", "created_at")),  # Scoped permissions, newest first
+    ("permission", "idx_rbac_permissions_role", ("role", "created_at")),  # Role permissions, newest first
+    ("user_role", "idx_rbac_user_roles_user", ("user", "role")),  # Roles of users, covers the join with roles and permissions
+)
+
+
+def index_statements(permission_model: Type[Model], user_role_model: Type[Model], dialect: str, concurrently: bool = False) -> list[tuple[str, str, str]]:
+    """
+    CREATE INDEX statements for indexes, which TortoiseRBACManager queries rely on
+
+    :param dialect: Database dialect (connection.capabilities.dialect)
+    :param concurrently: Only for postgres. Create indexes without locking tables for writes (slower, can not run in a transaction)
+    :return: List of [table, index name, SQL]
+    """
+    models = {"permission": permission_model, "user_role": user_role_model}
+    statements = []
+
+    for model_name, name, fields in INDEXES:
+        columns = _Columns(models[model_name])
+        column_list = ", ".join(getattr(columns, i) for i in fields)
+
+        if dialect == "mysql":  # No IF NOT EXISTS, see apply_indexes
+            sql = f"CREATE INDEX {name} ON {columns.table} ({column_list})"
+        else:
+            sql = f"CREATE INDEX {'CONCURRENTLY ' if concurrently and dialect == 'postgres' else ''}IF NOT EXISTS {name} ON {columns.table} ({column_list})"
+
+        statements.append((columns.table, name, sql))
+
+    return statements
+
+
+async def apply_indexes(permission_model: Type[Model], user_role_model: Type[Model], concurrently: bool = False) -> list[str]:
+    """
+    Create indexes, which TortoiseRBACManager queries rely on, in an existing database. Safe to run on every startup, existing indexes are skipped.
+    New databases can get the same indexes from Meta.indexes of models instead (see /entities/permissions.py)
+
+    :param permission_model: Permission Tortoise model
+    :param user_role_model: Many-to-many model of users and roles
+    :param concurrently: Only for postgres. See index_statements
+    :return: Names of all indexes
+    """
+    connection: BaseDBAsyncClient = permission_model._meta.db
+    dialect = connection.capabilities.dialect
+    names = []
+
+    for table, name, sql in index_statements(permission_model, user_role_model, dialect, concurrently=concurrently):
+        names.append(name)
+
+        if dialect == "mysql":
+            _, rows = await connection.execute_query(
+                "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+                [table, name]
+            )
+            if rows:
+                continue
+
+        await connection.execute_script(sql)
+
+    return names
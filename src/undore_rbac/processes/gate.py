@@ -1,4 +1,7 @@
+import time
+from datetime import datetime, timezone
 from functools import cached_property
+from itertools import chain, groupby, pairwise
 from typing import Union, Any, Sequence
 
 from ascender.core.di.injectfn import inject
@@ -6,9 +9,14 @@ from ascender.core.di.injectfn import inject
 from undore_rbac.base_manager import Access
 from undore_rbac.exceptions import InsufficientPermissions
 from undore_rbac.interfaces.config import RBACConfig
-from undore_rbac.interfaces.permissions import IRBACPermission, IRBACRole, IRawRBACPermission, IRBACChildPermission
+from undore_rbac.interfaces.permissions import IRBACPermission, IRBACRole, IRawRBACPermission, PermissionRecord, RoleRecord, as_permission_record, as_role_record, \
+    expiry_timestamp
 from undore_rbac.services.rbac_service import RbacService
 from undore_rbac.types.rbac_map import RBACMap
+from undore_rbac.types.requirements import RBACRequirements
+from undore_rbac.types.role_layer import RoleLayer
+from undore_rbac.types.snapshot import RBACSnapshot
+from undore_rbac.utils.ttl_cache import TTLCache
 
 
 class RBACGate:
@@ -19,15 +27,36 @@ class RBACGate:
 
     Keep in mind that if permissions changed, you need to update overrides using the method update_overrides
     for changes to take effect. Roles and permissions properties are strictly read-only.
+
+    Expired permissions (see IRBACPermission.expires_at) are ignored. When one of the permissions expires,
+    the gate is compiled again on the next check or read of compiled permissions (see expires_at)
+
+    Decisions for raw permissions are memoized, so checking the same permission again costs one dict lookup.
+    decisions_max_size: Maximum amount of memoized decisions. The memo is cleared, when it is full
     """
     rbac_service: RbacService = inject(RbacService)
+    decisions_max_size: int = 1024
 
-    def __init__(self, *, user_permissions: list[IRBACPermission], user_roles: list[IRBACRole], rbac_map: RBACMap, custom_user: Any | None = None):
+    def __init__(self, *, user_permissions: list[IRBACPermission | PermissionRecord | tuple], user_roles: list[IRBACRole | RoleRecord | tuple],
+                 rbac_map: RBACMap, custom_user: Any | None = None, role_layers: TTLCache | None = None, config: RBACConfig | None = None):
+        """
+        :param user_permissions: User permissions and permissions of user roles. Records and plain tuples are not validated (see PermissionRecord)
+        :param user_roles: User roles. Records and plain tuples are not validated (see RoleRecord)
+        :param role_layers: Optional cache of compiled role layers, shared between gates (see RbacService.role_layers)
+        :param config: Optional RBACConfig. Injected, if not provided (for example, can be passed outside of the application)
+        """
         self.__user_permissions = user_permissions
         self.__user_roles = user_roles
         self.__custom_user: Any | None = custom_user
+        self.__role_layers = role_layers
+        self.__expires_at: float | None = None  # Unix timestamp of the earliest expiry, set when permissions are compiled
+        self.__permissions: dict[str, bool] | None = None  # See user_permissions_dict
+        self.__permissions_list: list[tuple[str, bool]] | None = None  # See user_permissions
+        self.__snapshot: RBACSnapshot | None = None
+        self.__decisions: dict[str, tuple[bool, IRawRBACPermission]] = {}  # rawPermission -> (Status, RBAC Map entry)
+        self.__decisions_generation: int | None = None
         self.rbac_map = rbac_map
-        self.config = inject(RBACConfig)
+        self.config = config if config is not None else inject(RBACConfig)
 
     @property
     def user(self) -> Any | None:
@@ -42,7 +71,7 @@ class RBACGate:
     async def from_user_id(cls, user_id: Any, custom_meta: dict | None = None) -> "RBACGate":
         """
         Initialize RBACGate from user_id
-        Calls rbac_manager.fetch_user_access(user_id, custom_meta)
+        Calls rbac_manager.fetch_user_access(user_id, custom_meta), unless access is cached (see RBACConfig.access_cache_config)
 
         :param user_id: User id to check permissions for
         :param custom_meta: Custom meta to be passed to the fetch_user_access in your RBAC Manager
@@ -52,12 +81,13 @@ class RBACGate:
         else:
             rbac_service = inject(RbacService)
 
-        user_access = await rbac_service.manager.fetch_user_access(user_id, custom_meta=custom_meta)
-        user_roles: list[IRBACRole] = user_access['roles']
-        user_permissions: list[IRBACPermission] = user_access['permissions']
+        user_access = await rbac_service.fetch_user_access(user_id, custom_meta=custom_meta)
+        user_roles: list[IRBACRole | RoleRecord | tuple] = user_access['roles']
+        user_permissions: list[IRBACPermission | PermissionRecord | tuple] = user_access['permissions']
         user: Any | None = user_access['user']
 
-        return cls(user_permissions=user_permissions, user_roles=user_roles, rbac_map=rbac_service.rbac_map, custom_user=user)
+        return cls(user_permissions=user_permissions, user_roles=user_roles, rbac_map=rbac_service.rbac_map, custom_user=user,
+                   role_layers=rbac_service.role_layers)
 
     @classmethod
     def from_access(cls, access: Access) -> "RBACGate":
@@ -72,23 +102,34 @@ class RBACGate:
         else:
             rbac_service = inject(RbacService)
 
-        user_roles: list[IRBACRole] = access['roles']
-        user_permissions: list[IRBACPermission] = access['permissions']
+        user_roles: list[IRBACRole | RoleRecord | tuple] = access['roles']
+        user_permissions: list[IRBACPermission | PermissionRecord | tuple] = access['permissions']
         user: Any | None = access['user']
 
-        return cls(user_permissions=user_permissions, user_roles=user_roles, rbac_map=rbac_service.rbac_map, custom_user=user)
+        return cls(user_permissions=user_permissions, user_roles=user_roles, rbac_map=rbac_service.rbac_map, custom_user=user,
+                   role_layers=rbac_service.role_layers)
 
     @cached_property
-    def user_roles(self) -> list[IRBACRole]:
+    def user_roles(self) -> list[IRBACRole | RoleRecord]:
         """
-        Get user roles, which are cached when initializing
+        Get user roles, which are cached when initializing. Plain tuples are converted to RoleRecord
         Does not make any database requests
         :return: Dict of [roleId, IRBACRole]
         """
-        return self.__user_roles
+        return [as_role_record(i) for i in self.__user_roles]
+
+    @property
+    def expires_at(self) -> datetime | None:
+        """
+        Earliest expiry of user permissions, which are not expired yet. Access of this gate changes at this moment,
+        so it (or Access it was created from) can be cached until then
+        :return: Aware UTC datetime, or None if none of the permissions expire
+        """
+        self.user_permissions_dict  # noqa: Compile permissions, if not yet or expired
+        return datetime.fromtimestamp(self.__expires_at, timezone.utc) if self.__expires_at is not None else None
 
     @cached_property
-    def user_roles_dict(self) -> dict[Any, IRBACRole]:
+    def user_roles_dict(self) -> dict[Any, IRBACRole | RoleRecord]:
         """
         Get user roles in pairs of id and role
         Calculated only once to save performance. Use update_overrides to update this.
@@ -96,9 +137,10 @@ class RBACGate:
 
         :return: Dict of [roleId, IRBACRole]
         """
-        return {i.id: i for i in self.__user_roles}
+        return {i.id: i for i in self.user_roles}
 
-    def update_overrides(self, *, user_permissions: Union[list[IRBACPermission], False], user_roles: Union[list[IRBACRole], False]) -> None:
+    def update_overrides(self, *, user_permissions: Union[list[IRBACPermission | PermissionRecord | tuple], False],
+                         user_roles: Union[list[IRBACRole | RoleRecord | tuple], False]) -> None:
         """
         Update permissions and roles read-only attributes
 
@@ -110,97 +152,189 @@ class RBACGate:
         :param user_permissions: New user permissions (including user roles permissions). If False, keep current
         :return: None
         """
-        self.__user_roles = user_roles
-        self.__user_permissions = user_permissions
-        del self.user_roles
-        del self.user_permissions
+        if user_roles is not False:
+            self.__user_roles = user_roles
+        if user_permissions is not False:
+            self.__user_permissions = user_permissions
 
-        # TODO: TEST THIS
+        self._reset_cache()
 
-    @cached_property
-    def user_permissions_dict(self) -> dict[str, bool]:
+    def _reset_cache(self) -> None:
         """
-        self.user_permissions, but not sorted by priority and as a dict
-        :return: Dict of [rawPermission, Value]
+        Drop everything, calculated from current permissions and roles
         """
-        return {k: v for k, v in self.user_permissions}
+        for attribute in ("user_roles", "user_roles_dict"):
+            self.__dict__.pop(attribute, None)
 
-    @cached_property
-    def user_permissions(self) -> list[tuple[str, bool]]:
+        self.__expires_at = None
+        self.__permissions = None
+        self.__permissions_list = None
+        self.__snapshot = None
+        self.__decisions = {}
+
+    def __drop_expired(self) -> None:
         """
-        Parses all user permissions with values, sorted by priority
+        Drop everything, calculated from current permissions, if one of them has expired since then
+        """
+        if self.__expires_at is not None and time.time() >= self.__expires_at:
+            self._reset_cache()
 
-        Takes in account permission values and role priority overrides
-        This means, that permission values will be sorted in this order:
-        1. Child permissions: Permissions, defined as child permissions in RBAC Map for parent permission, which user has
-        2. Role (shared) permissions: Ones with the highest role priority are the last, if same - last one is the newest
-        3. User permissions
-        4. Wildcards (* permissions/overrides)
+    @property
+    def user_permissions_dict(self) -> dict[str, bool]:
+        """
+        self.user_permissions as a dict. Keys keep the same priority order
+        Calculated only once (until one of the permissions expires) to save performance. Use update_overrides to update this.
 
-        Last permissions override previous, so user permissions are the highest priority (after wildcards) and child permissions are the lowest (priority)
-        The higher is group priority, the more important it is (in sense of overrides)
+        :raises ValueError: If permission is invalid
+        :return: Dict of [rawPermission, Value]
+        """
+        self.__drop_expired()
 
-        Also keep in mind, that overrides (* permissions) are generally more important than normal ones and can override their value,
-        REGARDLESS of their priority. So, wildcard role permission WILL override normal user permission, but a user wildcard can override it
+        if self.__permissions is None:
+            self.__permissions = self.__compile_permissions()
 
-        Calculated only once to save performance. Use update_overrides to update this.
+        return self.__permissions
 
-        :raises ValueError: If permission is invalid
-        :return: Dict of [permission, value]
-        """
+    def __compile_permissions(self) -> dict[str, bool]:
+        scoped_permissions: list[IRBACPermission | PermissionRecord] = []
+        shared_permissions: dict[Any, list[IRBACPermission | PermissionRecord]] = {}
+        shared_records: list[IRBACPermission | PermissionRecord] = []  # Permissions of every role, in order of records
+        child_permissions: list[tuple[str, bool]] = []
+        expiring_roles: dict[Any, int] = {}  # roleId -> amount of role permissions, which expire later
 
-        scoped_permissions: list[IRBACPermission] = []
-        shared_permissions: list[IRBACPermission] = []
-        child_permissions: list[IRBACChildPermission] = []
+        now = time.time()
+        self.__expires_at = None
 
-        for permission in self.__user_permissions:
-            permission: IRBACPermission
+        for permission in map(as_permission_record, self.__user_permissions):
+            if permission.expires_at is not None:
+                if (expires_at := expiry_timestamp(permission.expires_at)) <= now:
+                    continue
 
-            map_permission = self.rbac_map.find(permission.permission)
-            if not map_permission and not permission.permission.endswith("*"):
-                raise ValueError(f"Permission {permission.permission} not found in RBAC Map")
-            elif map_permission:
-                if map_permission.config.children is not None and permission.value is True:
-                    child_permissions.extend(map_permission.config.children)
+                if self.__expires_at is None or expires_at < self.__expires_at:
+                    self.__expires_at = expires_at
+                if not permission.user_id and permission.role_id:
+                    expiring_roles[permission.role_id] = expiring_roles.get(permission.role_id, 0) + 1
 
             if permission.user_id:
+                map_permission = self.rbac_map.find(permission.permission)
+                if not map_permission and not permission.permission.endswith("*"):
+                    raise ValueError(f"Permission {permission.permission} not found in RBAC Map")
+                elif map_permission and permission.value is True:
+                    child_permissions.extend(self.rbac_map.children_of(permission.permission))
+
                 scoped_permissions.append(permission)
             elif permission.role_id:
-                shared_permissions.append(permission)
+                # Validated and expanded once per role, see RoleLayer
+                shared_permissions.setdefault(permission.role_id, []).append(permission)
+                shared_records.append(permission)
             else:
                 raise ValueError(
                     f"Invalid permission id={permission.id}. Permission must have either user_id or role_id")
 
-        shared_permissions.sort(key=lambda _permission: self.user_roles_dict[_permission.role_id].priority)
-        # Make shared permissions arrange from the lowest role priority to highest
+        role_layers = [self.__role_layer(role_id, permissions, expiring_roles.get(role_id, 0)) for role_id, permissions in shared_permissions.items()]
+        role_layers.sort(key=lambda _layer: self.user_roles_dict[_layer.role_id].priority)
+        # Make role layers arrange from the lowest role priority to highest
+
+        role_children: list[Sequence[tuple[str, bool]]] = []
+        role_permissions: list[Sequence[tuple[str, bool]]] = []
+
+        for _, layers in groupby(role_layers, key=lambda _layer: self.user_roles_dict[_layer.role_id].priority):
+            layers = list(layers)
+
+            if len(layers) == 1:
+                role_children.append(layers[0].children)
+                role_permissions.append(layers[0].permissions)
+                continue
+
+            # Roles of the same priority are merged in order of their records (the newest one wins), not one role after another.
+            # Their permissions are already validated by their layers
+            role_ids = {i.role_id for i in layers}
+            records = [i for i in shared_records if i.role_id in role_ids]
 
-        scoped_permissions_copy = scoped_permissions.copy()
-        scoped_permissions.sort(key=lambda _permission: _permission.created_at, reverse=True)
+            role_children.append(tuple(chain.from_iterable(self.rbac_map.children_of(i.permission) for i in records if i.value is True)))
+            role_permissions.append(tuple((i.permission, i.value) for i in records))
 
-        if scoped_permissions_copy != scoped_permissions:
+        if not all(a.created_at >= b.created_at for a, b in pairwise(scoped_permissions)):
             if self.config.require_sorted_permissions:
                 raise RuntimeError("IRBACPermissions must be sorted by created_at (Newer ones first). Please, implement this in your manager "
                                    "\nYou can disable this requirement in config. See RBACConfig docs for details")
 
-        permissions_sorted: list[tuple[str, bool]] = []
+            scoped_permissions.sort(key=lambda _permission: _permission.created_at, reverse=True)
+
+        permissions_sorted: dict[str, bool] = {}
 
         # Combine and override all permissions with the highest priority values
-        for permission in child_permissions + shared_permissions + scoped_permissions:
-            permission: IRBACPermission
+        # Dict keeps insertion order, so it is both the priority-sorted view and the lookup table
+        for permission, value in chain(
+                *role_children,
+                child_permissions,
+                *role_permissions,
+                ((i.permission, i.value) for i in scoped_permissions)
+        ):
+            if permission not in permissions_sorted:
+                permissions_sorted[permission] = value
 
-            raw_permissions = [i[0] for i in permissions_sorted]
-            if permission.permission in raw_permissions:
-                continue
+        return permissions_sorted
 
-            permissions_sorted.append((permission.permission, permission.value))
+    def __role_layer(self, role_id: Any, permissions: list[IRBACPermission | PermissionRecord], expiring: int) -> RoleLayer:
+        if self.__role_layers is None:
+            return RoleLayer.compile(role_id, permissions, self.rbac_map)
 
-        return permissions_sorted
+        key = RoleLayer.key(self.user_roles_dict[role_id], permissions, expiring)
 
-    def _check_overrides(self, check_permission: str) -> bool | None:
-        override_permissions = [i for i in self.user_permissions if i[0].endswith("*")]
-        return self.__check_permission_overriding(check_permission, override_permissions)
+        layer: RoleLayer | None = self.__role_layers.get(key)
+        if layer is None or layer.rbac_map is not self.rbac_map:
+            layer = RoleLayer.compile(role_id, permissions, self.rbac_map)
+            self.__role_layers.set(key, layer)
 
-    def check_access(self, required_permissions: str | Sequence[str], auto_error: bool = True) -> tuple[bool, IRawRBACPermission | None]:
+        return layer
+
+    @property
+    def user_permissions(self) -> list[tuple[str, bool]]:
+        """
+        Parses all user permissions with values, sorted by priority
+
+        Takes in account permission values and role priority overrides
+        This means, that permission values will be sorted in this order:
+        1. Child permissions: Permissions, defined as child permissions in RBAC Map for parent permission, which user has
+        2. Role (shared) permissions: Ones with the highest role priority are the last, if same - last one is the newest
+        3. User permissions
+        4. Wildcards (* permissions/overrides)
+
+        Last permissions override previous, so user permissions are the highest priority (after wildcards) and child permissions are the lowest (priority)
+        The higher is group priority, the more important it is (in sense of overrides)
+
+        Also keep in mind, that overrides (* permissions) are generally more important than normal ones and can override their value,
+        REGARDLESS of their priority. So, wildcard role permission WILL override normal user permission, but a user wildcard can override it
+
+        Calculated only once (until one of the permissions expires) to save performance. Use update_overrides to update this.
+
+        :raises ValueError: If permission is invalid
+        :return: Dict of [permission, value]
+        """
+        permissions = self.user_permissions_dict
+
+        if self.__permissions_list is None:
+            self.__permissions_list = list(permissions.items())
+
+        return self.__permissions_list
+
+    @property
+    def snapshot(self) -> RBACSnapshot:
+        """
+        User access, compiled into bitsets. Used by check_access
+        Can be kept instead of the whole gate, if only permission checks are needed (see RBACSnapshot).
+        A kept snapshot does not drop permissions, which expire later: take it from the gate again after its expires_at
+        Calculated only once (until one of the permissions expires) to save performance. Use update_overrides to update this.
+        """
+        permissions = self.user_permissions_dict
+
+        if self.__snapshot is None:
+            self.__snapshot = RBACSnapshot.compile(self.rbac_map, permissions, expires_at=self.__expires_at)
+
+        return self.__snapshot
+
+    def check_access(self, required_permissions: str | Sequence[str] | RBACRequirements, auto_error: bool = True) -> tuple[bool, IRawRBACPermission | None]:
         """
         Checks if user has specific permission(s).
         Takes overrides, values, roles, permission configs and priorities into account
@@ -211,84 +345,73 @@ class RBACGate:
 
         Reason is an IRawRBACPermission, being missing permission because of which access was denied (if it was)
 
+        Pass RBACRequirements (see RBACMap.compile_requirements) to skip RBAC Map lookups, if the same permissions are checked often
+
         :raises ValueError: If permission is not present in RBAC Map
         :raises InsufficientPermissions: If auto_error is True and access is denied
 
         :param auto_error: If True, will raise InsufficientPermissions if missing permissions
-        :param required_permissions: RBAC Permission(s) to check
+        :param required_permissions: RBAC Permission(s) or compiled RBACRequirements to check
         :return: Tuple of [Status, Reason]
         """
-        rp = list(required_permissions)
+        self.__drop_expired()
 
-        for check_permission in rp:
-            # noinspection PyTypeChecker
-            if not (_permission := self.rbac_map.find(check_permission)):
-                raise ValueError(f"Permission {check_permission} is not present in RBAC Map")
+        if isinstance(required_permissions, RBACRequirements):
+            return self.snapshot.check_access(required_permissions, auto_error=auto_error)
 
-            if not _permission.config.explicit:
-                # Do not check overrides, if explicit permission
-
-                override_check = self._check_overrides(check_permission)
-                if override_check is False:
-                    if auto_error:
-                        raise InsufficientPermissions(required_permission=check_permission)
-                elif override_check is True:
-                    continue  # Do not step further if override check is successful
-
-            if self.user_permissions_dict.get(_permission.permission, _permission.config.default):
-                continue
+        if isinstance(required_permissions, str):
+            decisions = (self.__decide(required_permissions),)
+        else:
+            # Every permission is decided first, so a permission missing in RBAC Map raises even after a denied one
+            decisions = [self.__decide(i) for i in required_permissions]
 
-            if auto_error:
-                raise InsufficientPermissions(required_permission=check_permission)
-            return False, _permission
+        for status, entry in decisions:
+            if not status:
+                if auto_error:
+                    raise InsufficientPermissions(required_permission=entry.permission)
+                return False, entry
 
         return True, None
 
-
-    def __check_permission_overriding(self, required_permission: str, overrides: list[tuple[str, bool]]) -> bool | None:
+    def check_many(self, permissions: Sequence[str] | RBACRequirements) -> dict[str, bool]:
         """
-        Applies overrides (permissions ending with *, overriding children permissions as True)
-        to certain permission to check if any of the overrides cover this permission
-
-        WARNING: Takes Values into account, so override with False value will false-override all children permissions
-        This method will not be automatically called if permission is Explicit
-        WARNING 2: All overrides must be sorted in order of priority (most important are first)
+        Checks many permissions at once and returns decision for every one of them, instead of stopping at the first denial.
+        For example, to find out which actions user may perform in UI.
 
-        For example:
+        Permissions are resolved against RBAC Map and evaluated in one pass,
+        sharing overrides resolution with every other check of this gate
 
-        permission = users.view
-        overrides = ["users.*", "moderation.*"]
-        Result: True (Because users.* covers users.view)
-
-        :param required_permission: Original permission
-        :param overrides: Permission overrides (permissions ending with *). List of tuples of [RawPermission, Value]
-        :raises ValueError: If an override does not end with *
-        :return: True if permission is overridden as True, False if overridden as False, None if not overridden
+        :raises ValueError: If permission is not present in RBAC Map
+        :param permissions: RBAC Permissions or compiled RBACRequirements to check
+        :return: Dict of [rawPermission, Status]
         """
-        permission_parts = required_permission.split(".")
-        total_permission_parts = len(permission_parts)
-
-        for override, value in overrides:
-            if not override.endswith("*"):
-                raise ValueError("Override must end with *")
+        self.__drop_expired()
 
-            for p_index, part in enumerate(override.split(".")):
-                if total_permission_parts - 1 < p_index:
-                    # No point in checking further, because override part index is out of range
-                    break
+        if isinstance(permissions, RBACRequirements):
+            return self.snapshot.check_many(permissions)
 
-                if part == "*" and p_index <= total_permission_parts:
-                    # p_index here is the index of current part, which is *
-                    # To compare previous override level (index) to required_permission parts,
-                    # subtract 1 from p_index, but total_permission_parts also requires subtracting 1
-                    # to account for length being +1 of index length, so there is two -1 on both sides and they just equalize
+        return {entry.permission: status for status, entry in map(self.__decide, permissions)}
 
-                    # Basically, the ride side of this comparison could look like this:
-                    # (p_index - 1) <= (total_permission_parts - 1)
-
-                    return value
-
-                if part != permission_parts[p_index]:
-                    break
+    def __decide(self, permission: str) -> tuple[bool, IRawRBACPermission]:
+        """
+        Memoized decision for a single raw permission
 
-        return None
+        :raises ValueError: If permission is not present in RBAC Map
+        :return: Tuple of [Status, RBAC Map entry]
+        """
+        if (decision := self.__decisions.get(permission)) is not None and self.__decisions_generation == self.rbac_map.generation:
+            return decision
+
+        requirement = next(iter(self.rbac_map.compile_requirements((permission,))))
+        decision = self.snapshot.has(requirement.permission), requirement.entry
+
+        # Taken after deciding: the decision itself may load namespaces of a lazy map
+        if self.__decisions_generation != (generation := self.rbac_map.generation):
+            # More namespaces were loaded, wildcards may cover more permissions now (see RBACMap lazy loading)
+            self.__decisions = {}
+            self.__decisions_generation = generation
+        elif len(self.__decisions) >= self.decisions_max_size:
+            self.__decisions = {}
+
+        self.__decisions[permission] = decision
+        return decision
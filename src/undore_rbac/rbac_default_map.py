@@ -4,5 +4,6 @@ DEFAULT_RBAC_MAP = {
             "explicit": True,
             "default": False
         }
-    }
+    },
+    "undore_rbac.users.permissions.view": None  # Required by RBACController
 }
\ No newline at end of file
@@ -1,3 +1,5 @@
+import json
+import logging
 from logging import Logger
 
 from ascender.common import Injectable
@@ -6,21 +8,23 @@ from ascender.core.applications.application import Application
 from ascender.core.di.injectfn import inject
 from fastapi.encoders import jsonable_encoder
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import Response
 
 from undore_rbac.interfaces.config import RBACConfig
 from undore_rbac.logger import init_logger
 from undore_rbac.exceptions import RBACHTTPException
-from undore_rbac.services.rbac_service import RbacService
+from undore_rbac.utils.ttl_cache import TTLCache
 
 
 @Injectable()
 class RbacExceptionHandlerService(Service):
-    logger: Logger = init_logger("DEBUG")
+    logger: Logger
 
     def __init__(self, application: Application):
         self.app = application
         config = inject(RBACConfig)
+        self.logger = init_logger(config.log_level, config.log_mode)
+        self.__bodies = TTLCache(1024)
 
         if config.exception_handler_config.use:
             if config.exception_handler_config.enable_usage_warning:
@@ -34,23 +38,36 @@ class RbacExceptionHandlerService(Service):
         if not isinstance(exc, RBACHTTPException):
             return None
 
-        user_id = None
+        if self.logger.isEnabledFor(logging.INFO):
+            # Resolved by RBACGuard, the token is not authorized again
+            user_id = getattr(request.state, "rbac_user_id", None)
 
-        rbac = inject(RbacService)
+            self.logger.info("[bold red]RBAC Exception handled%s[/bold red]: [yellow]%s", f" for user id={user_id}" if user_id is not None else "", exc,
+                             extra={"user_id": user_id, "request_url": request.url.path})
 
-        token = None
+        return Response(
+            status_code=exc.status_code,
+            content=self.__body(exc),
+            headers=exc.headers,
+            media_type="application/json"
+        )
+
+    def __body(self, exc: RBACHTTPException) -> bytes:
+        """
+        Serialized response body. Bodies are the same for every denial of the same permission, so they are built once
+        """
         try:
-            token = request.state.token
-        except AttributeError:
-            pass
+            key = (type(exc), exc.status_code, exc.detail, exc.error_code, frozenset(exc.kwargs.items()))
+            hash(key)
+        except TypeError:
+            key = None
 
-        if token:
-            user_id = await rbac.manager.authorize(token, request=request)
+        if key is not None and (body := self.__bodies.get(key)) is not None:
+            return body
 
-        self.logger.info(f"[bold red]RBAC Exception handled{' for user id={}'.format(user_id) if user_id else ''}[/bold red]: [yellow]{exc}")  # War crime
+        body = json.dumps(jsonable_encoder(exc.__dict__()), separators=(",", ":")).encode()
 
-        return JSONResponse(
-            status_code=exc.status_code,
-            content=jsonable_encoder(exc.__dict__()),
-            headers=exc.headers
-        )
+        if key is not None:
+            self.__bodies.set(key, body)
+
+        return body
@@ -1,3 +1,7 @@
+import logging
+import weakref
+from typing import ClassVar
+
 from ascender.guards import Guard
 from fastapi import Request, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
@@ -5,16 +9,24 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from undore_rbac.exceptions import InsufficientPermissions
 from undore_rbac.services.rbac_service import RbacService
 from undore_rbac.processes.gate import RBACGate
+from undore_rbac.types.rbac_map import RBACMap
+from undore_rbac.types.requirements import RBACRequirements
+from undore_rbac.utils.metrics import PHASE_AUTHORIZE, PHASE_FETCH, PHASE_COMPILE, PHASE_CHECK
 
 # noinspection PyMethodOverriding
 class RBACGuard(Guard):
     rbac: RbacService
+    # Compiled by RbacService on application startup and map reload. Weak, so guards created at runtime are not kept alive
+    instances: ClassVar[weakref.WeakSet["RBACGuard"]] = weakref.WeakSet()
 
     def __init__(self, *permissions: str):
         """
         Use __init__ for accepting parameters of guard decorator
         """
         self.permissions = permissions
+        self.requirements: RBACRequirements | None = None
+
+        RBACGuard.instances.add(self)
 
     def __post_init__(self, rbac: RbacService):
         """
@@ -23,17 +35,45 @@ class RBACGuard(Guard):
         self.rbac = rbac
         self.logger = self.rbac.logger
 
+        if self.requirements is None or self.requirements.rbac_map is not rbac.rbac_map:
+            self.compile(rbac.rbac_map)
+
+    def compile(self, rbac_map: RBACMap) -> None:
+        """
+        Resolve guard permissions against RBAC Map, so requests only evaluate them
+
+        :raises ValueError: If permission is not present in RBAC Map
+        """
+        self.requirements = rbac_map.compile_requirements(self.permissions)
+
     async def can_activate(self, request: Request, token: HTTPAuthorizationCredentials = Security(HTTPBearer())):
         """
         Works same as FastAPI's Dependency Injection
         """
-        user_id = await self.rbac.manager.authorize(token.credentials, request=request, custom_meta={"org_id": 123})
+        timer = self.rbac.phase_timer()
+
+        user_id = await self.rbac.authorize(token.credentials, request=request, custom_meta={"org_id": 123})
+        request.state.rbac_user_id = user_id  # Reused by the RBAC exception handler and endpoints
+        if timer is not None:
+            timer.lap(PHASE_AUTHORIZE)
 
-        self.logger.debug(f"[bold cyan]Checking permissions for user id={user_id} on [bold magenta]{request.url.path}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("[bold cyan]Checking permissions for user id=%s on [bold magenta]%s", user_id, request.url.path)
 
         gate = await RBACGate.from_user_id(user_id, custom_meta={"org_id": 123})
-        status, reason = gate.check_access(self.permissions)
+        request.state.rbac_gate = gate
+        if timer is not None:
+            timer.lap(PHASE_FETCH)
+            gate.snapshot  # noqa: B018. Compiled by check_access anyway, separated only to be measured
+            timer.lap(PHASE_COMPILE)
+
+        status, reason = gate.check_access(self.requirements, auto_error=False)
+        if timer is not None:
+            timer.lap(PHASE_CHECK)
+            self.rbac.record_check(timer, request.url.path, user_id, self.permissions, reason.permission if reason else None)
+
         if status is False:
-            raise InsufficientPermissions(request_url=request.url.path, required_permission=reason)
+            raise InsufficientPermissions(request_url=request.url.path, required_permission=reason.permission)
 
-        self.logger.info(f"[green]Access granted for user id={user_id}")
+        if self.rbac.should_log_granted():
+            self.logger.info("[green]Access granted for user id=%s", user_id, extra={"user_id": user_id, "request_url": request.url.path})
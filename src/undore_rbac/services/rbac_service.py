@@ -1,19 +1,33 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import random
+import time
 from logging import Logger
-from typing import Sequence, TYPE_CHECKING
+from typing import Any, Hashable, Sequence, TYPE_CHECKING, NamedTuple
 
 from ascender.common import Injectable
 from ascender.core import Service
 from ascender.core.applications.application import Application
 from ascender.core.di.injectfn import inject
+from starlette.requests import Request
 from typing_extensions import deprecated
 
-from undore_rbac.base_manager import BaseRBACManager
+from undore_rbac.base_manager import BaseRBACManager, Access
+from undore_rbac.cache_backends.base import BaseCacheBackend
+from undore_rbac.cache_backends.memory import MemoryCacheBackend
 from undore_rbac.exceptions import InsufficientPermissions
 from undore_rbac.interfaces.config import RBACConfig
+from undore_rbac.interfaces.permissions import as_permission_record, expiry_timestamp
 from undore_rbac.logger import init_logger
-from undore_rbac.types.rbac_map import RBACMap
+from undore_rbac.types.rbac_map import RBACMap, RBACMapDiff
+from undore_rbac.utils.freeze import freeze
+from undore_rbac.utils.metrics import RBACMetrics, PhaseTimer, PHASE_TOTAL
+from undore_rbac.utils.ttl_cache import TTLCache, CacheStats
 
 if TYPE_CHECKING:
     from undore_rbac.rbac_exception_handler_service import RbacExceptionHandlerService
@@ -23,7 +37,7 @@ if TYPE_CHECKING:
 @Injectable()
 class RbacService(Service):
     """
-    RBACService is not very useful right now, but I'll get to it
+    RBACService holds the RBAC Map and the RBAC Manager, and caches what they provide (if enabled in RBACConfig)
     """
     logger: Logger
     handler: RbacExceptionHandlerService
@@ -35,9 +49,33 @@ class RbacService(Service):
         self.handler: RbacExceptionHandlerService = inject("ExceptionHandler")
 
         self.__manager: BaseRBACManager = config.rbac_manager
-        self.rbac_map = RBACMap(self.config.rbac_map_path)
+        self.rbac_map = RBACMap(self.config.rbac_map_path, cache_path=self.config.rbac_map_cache_path, lazy=self.config.rbac_map_lazy_loading)
+
+        cache_config = self.config.access_cache_config
+        self.access_cache: BaseCacheBackend | None = (cache_config.backend or MemoryCacheBackend(cache_config.max_size, cache_config.ttl)) if cache_config.use else None
+        self.role_layers = TTLCache(cache_config.role_layers_max_size)
+        # Keys of cached access, which was fetched or revalidated less than revalidate_after seconds ago
+        self.__validated: TTLCache | None = (
+            TTLCache(cache_config.max_size, cache_config.revalidate_after) if cache_config.use and cache_config.revalidate_after is not None else None
+        )
+
+        authorization_config = self.config.authorization_cache_config
+        self.authorization_cache: TTLCache | None = TTLCache(authorization_config.max_size) if authorization_config.use else None
+        self.__inflight_fetches: dict[tuple[Any, Hashable], asyncio.Task[Access]] = {}
+
+        # Invalidation epochs: access, which started being fetched before an invalidation, is not handed out or cached
+        self.__epoch = 0  # Increased by every invalidation
+        self.__global_epoch = 0  # Epoch of the last invalidate_role or invalidate_all
+        self.__user_epochs: dict[Any, int] = {}  # userId -> epoch of its last invalidation. Only kept while the user is being fetched
+        self.__fetching: dict[Any, int] = {}  # userId -> amount of fetches in progress
+        self.__reload_lock = asyncio.Lock()
+
+        metrics_config = self.config.metrics_config
+        self.metrics: RBACMetrics | None = RBACMetrics(metrics_config.buckets, metrics_config.track_permissions) if metrics_config.use else None
+        self.__instrumented = self.metrics is not None or metrics_config.slow_check_threshold is not None
 
         self.application.app.add_event_handler("startup", self.on_startup)
+        self.application.app.add_event_handler("shutdown", self.on_shutdown)
 
     @property
     def manager(self) -> BaseRBACManager:
@@ -50,8 +88,459 @@ class RbacService(Service):
         """
         return self.__manager
 
-    def on_startup(self):
-        self.logger = init_logger(self.config.log_level)
+    async def on_startup(self):
+        self.logger = init_logger(self.config.log_level, self.config.log_mode)
+        self.compile_guards()
+
+        if self.access_cache is not None:
+            await self.access_cache.start()
+
+    async def on_shutdown(self):
+        if self.access_cache is not None:
+            await self.access_cache.close()
+
+    def compile_guards(self) -> None:
+        """
+        Resolve permissions of every RBACGuard against RBAC Map.
+        Called on application startup, so a typo in route permissions fails the startup instead of a request
+
+        :raises ValueError: If a guard requires a permission, which is not present in RBAC Map
+        """
+        from undore_rbac.rbac_guard import RBACGuard
+
+        for guard in list(RBACGuard.instances):
+            guard.compile(self.rbac_map)
+
+    async def reload_map(self) -> RBACMapDiff:
+        """
+        Read RBAC Map again and replace the current one, without restarting the application.
+        Only changed sources are parsed again (see RBACMap.reload). It is done in a worker thread, so requests are not blocked.
+
+        Requests in flight finish with the map they started with, new gates use the new map.
+        Guards are compiled against the new map before it is used, and role layers stay cached, unless their permissions changed
+
+        :raises ValueError: If new map is invalid, or a guard requires a permission which was removed. The current map is kept then
+        :return: Added, removed and changed permissions
+        """
+        from undore_rbac.rbac_guard import RBACGuard
+
+        async with self.__reload_lock:
+            previous = self.rbac_map
+            # Sources are copied here, while lazy namespaces of the current map are loaded in this thread only
+            rbac_map = await asyncio.to_thread(previous.reloader())
+            diff = rbac_map.diff(previous)
+
+            guard_requirements = [(guard, rbac_map.compile_requirements(guard.permissions)) for guard in list(RBACGuard.instances)]
+
+            self.rbac_map = rbac_map
+
+            for guard, requirements in guard_requirements:
+                guard.requirements = requirements
+
+            affected = diff.removed | diff.changed
+            for key, layer in self.role_layers.items():
+                if layer.rbac_map is not previous or affected.intersection(permission for permission, _ in layer.permissions):
+                    self.role_layers.pop(key)
+                else:
+                    self.role_layers.set(key, layer.rebind(rbac_map))
+
+        self.logger.info("[green]RBAC Map reloaded: %d added, %d removed, %d changed", len(diff.added), len(diff.removed), len(diff.changed))
+        return diff
+
+    async def authorize(self, token: str, request: Request | None = None, custom_meta: dict | None = None) -> Any:
+        """
+        rbac_manager.authorize, cached by token hash, if enabled in RBACConfig.authorization_cache_config.
+        Used by RBACGuard
+
+        A user id is cached until the token expires (exp claim of a JWT), but not longer than the configured ttl.
+        Invalid tokens (see BaseRBACManager.negative_cache_exceptions) are rejected from cache for negative_ttl
+
+        :param token: Authentication token
+        :param request: Request, passed to rbac_manager.authorize
+        :param custom_meta: Custom meta dict, passed to rbac_manager.authorize
+        :return: User id
+        """
+        if self.authorization_cache is None or (frozen_meta := _frozen_meta(custom_meta)) is _UNHASHABLE:
+            return await self.__manager.authorize(token, request=request, custom_meta=custom_meta)
+
+        key = hashlib.sha256(token.encode()).digest(), frozen_meta
+
+        if (cached := self.authorization_cache.get(key)) is not None:
+            if isinstance(cached, _AuthorizationFailure):
+                # A copy, so requests do not share one exception instance and extend its traceback
+                raise _detached(cached.exception)
+            return cached.user_id
+
+        config = self.config.authorization_cache_config
+
+        try:
+            user_id = await self.__manager.authorize(token, request=request, custom_meta=custom_meta)
+        except self.__manager.negative_cache_exceptions as e:
+            if config.negative_ttl > 0:
+                # Without traceback, which would keep frames (and the request) of this call alive
+                self.authorization_cache.set(key, _AuthorizationFailure(_detached(e)), ttl=config.negative_ttl)
+            raise
+
+        ttl = config.ttl
+        if (expires_at := _token_expiry(token)) is not None:
+            ttl = min(ttl, expires_at - time.time())
+
+        if ttl > 0:
+            self.authorization_cache.set(key, _Authorization(user_id), ttl=ttl)
+
+        return user_id
+
+    def invalidate_token(self, token: str) -> None:
+        """
+        Drop a cached authorization of a token (for every custom_meta). Call it, when a token is revoked, for example on logout
+        """
+        if self.authorization_cache is None:
+            return
+
+        token_hash = hashlib.sha256(token.encode()).digest()
+        for key, _ in self.authorization_cache.items():
+            if key[0] == token_hash:
+                self.authorization_cache.pop(key)
+
+    async def fetch_user_access(self, user_id: Any, custom_meta: dict | None = None) -> Access:
+        """
+        Fetch user access through the RBAC Manager, or take it from the access cache, if enabled in RBACConfig
+
+        Concurrent calls for the same user and custom_meta share one RBAC Manager call (see RBACCacheConfig.single_flight).
+        If that call fails, the exception is raised in every caller.
+        Cached access is revalidated by its version, if enabled (see RBACCacheConfig.revalidate_after).
+        Access for custom_meta, which can not be a cache key (for example, it holds a non-frozen pydantic model), is neither cached nor shared
+
+        :param user_id: User ID To fetch permissions and roles for
+        :param custom_meta: Custom meta dict, passed to the fetch_user_access in your RBAC Manager
+        :return: Access object
+        """
+        if self.access_cache is None and not self.config.access_cache_config.single_flight:
+            return await self.__manager.fetch_user_access(user_id, custom_meta=custom_meta)
+
+        if (frozen_meta := _frozen_meta(custom_meta)) is _UNHASHABLE:
+            return await self.__manager.fetch_user_access(user_id, custom_meta=custom_meta)
+
+        key = user_id, frozen_meta
+
+        if self.access_cache is not None and (access := await self.__cached_access(user_id, custom_meta)) is not None:
+            if await self.__is_current(user_id, custom_meta, access):
+                return access
+
+        if not self.config.access_cache_config.single_flight:
+            return await self.__fetch_user_access(user_id, custom_meta)
+
+        if (task := self.__inflight_fetches.get(key)) is None:
+            task = asyncio.ensure_future(self.__fetch_user_access(user_id, custom_meta))
+            self.__inflight_fetches[key] = task
+            task.add_done_callback(lambda _task: self.__fetch_done(key, _task))
+
+        # Shield, so a cancelled caller does not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    async def __fetch_user_access(self, user_id: Any, custom_meta: dict | None) -> Access:
+        # Fetched again, if user access was invalidated meanwhile, so access from before the change is not handed out
+        for _ in range(_FETCH_ATTEMPTS):
+            started = self.__fetch_started(user_id)
+            try:
+                access = await self.__manager.fetch_user_access(user_id, custom_meta=custom_meta)
+
+                if self.__is_stale(user_id, started):
+                    continue
+
+                if self.access_cache is not None:
+                    await self.__cache_access(user_id, custom_meta, access, started)
+
+                return access
+            finally:
+                self.__fetch_finished(user_id)
+
+        # Invalidated during every attempt. The last access is the newest one, but it is not cached
+        return access
+
+    def __fetch_started(self, *user_ids: Any) -> int:
+        """
+        :return: Current invalidation epoch (see __is_stale)
+        """
+        for user_id in user_ids:
+            self.__fetching[user_id] = self.__fetching.get(user_id, 0) + 1
+
+        return self.__epoch
+
+    def __fetch_finished(self, *user_ids: Any) -> None:
+        for user_id in user_ids:
+            if count := self.__fetching[user_id] - 1:
+                self.__fetching[user_id] = count
+            else:
+                del self.__fetching[user_id]
+                self.__user_epochs.pop(user_id, None)
+
+    def __is_stale(self, user_id: Any, started: int) -> bool:
+        """
+        Whether access of a user was invalidated after a fetch started at epoch `started`
+        """
+        return self.__global_epoch > started or self.__user_epochs.get(user_id, 0) > started
+
+    async def __is_current(self, user_id: Any, custom_meta: dict | None, access: Access) -> bool:
+        """
+        Whether cached access can be used: it was fetched or revalidated recently, or its version is still the same
+        """
+        if self.__validated is None:
+            return True
+
+        key = user_id, freeze(custom_meta)
+        if key in self.__validated:
+            return True
+
+        version = access.get('version')
+        if version is None:
+            return False
+
+        started = self.__fetch_started(user_id)
+        try:
+            current = await self.__manager.fetch_access_version(user_id, custom_meta=custom_meta)
+
+            # Invalidated while the version was being fetched: the version could be read before the change
+            if _version_key(version) != _version_key(current) or self.__is_stale(user_id, started):
+                return False
+
+            # Cached again, so it lives for another ttl
+            await self.__cache_access(user_id, custom_meta, access, started)
+        finally:
+            self.__fetch_finished(user_id)
+
+        return True
+
+    async def __cached_access(self, user_id: Any, custom_meta: dict | None) -> Access | None:
+        # A broken cache backend (for example, Redis is down) must not break authorization, RBAC Manager is used instead
+        try:
+            return await self.access_cache.get(user_id, custom_meta)
+        except Exception as e:
+            self.logger.warning("[yellow]Access cache is unavailable: %r", e)
+            return None
+
+    async def __cache_access(self, user_id: Any, custom_meta: dict | None, access: Access, started: int) -> None:
+        await self.__cache_many({user_id: access}, custom_meta, started)
+
+    async def __cache_many(self, accesses: dict[Any, Access], custom_meta: dict | None, started: int) -> None:
+        """
+        :param accesses: Dict of [userId, Access]
+        :param started: Invalidation epoch, when fetching of this access started. Access invalidated since then is not cached
+        """
+        accesses = {user_id: access for user_id, access in accesses.items() if not self.__is_stale(user_id, started)}
+        now = time.time()
+        ttls = {}
+
+        for user_id, access in accesses.items():
+            if self.__validated is not None:
+                self.__validated.set((user_id, freeze(custom_meta)), True)
+
+            # Entries live until the earliest permission expiry at most, so long ttl can be used with temporary permissions
+            if (expires_at := _access_expiry(access)) is not None:
+                ttls[user_id] = expires_at - now
+
+        try:
+            if len(accesses) == 1:
+                (user_id, access), = accesses.items()
+                await self.access_cache.set(user_id, custom_meta, access, ttl=ttls.get(user_id))
+            elif accesses:
+                await self.access_cache.set_many(accesses, custom_meta, ttls=ttls)
+        except Exception as e:
+            self.logger.warning("[yellow]Access cache is unavailable: %r", e)
+
+    def __fetch_done(self, key: tuple[Any, Hashable], task: asyncio.Task) -> None:
+        if self.__inflight_fetches.get(key) is task:
+            del self.__inflight_fetches[key]
+
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved, waiters (if any are left) get it anyway
+
+    async def fetch_many_user_access(self, user_ids: Sequence[Any], custom_meta: dict | None = None) -> dict[Any, Access]:
+        """
+        Fetch access of many users with one rbac_manager.fetch_many_user_access call.
+        Users, which are present in the access cache, are not fetched again
+
+        :param user_ids: User IDs To fetch permissions and roles for
+        :param custom_meta: Custom meta dict, passed to the RBAC Manager
+        :return: Dict of [userId, Access]
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        result: dict[Any, Access] = {}
+
+        if _frozen_meta(custom_meta) is _UNHASHABLE:
+            # Can not be a cache key, see fetch_user_access
+            return await self.__manager.fetch_many_user_access(user_ids, custom_meta=custom_meta)
+
+        if self.access_cache is not None:
+            try:
+                result = await self.access_cache.get_many(user_ids, custom_meta)
+            except Exception as e:
+                self.logger.warning("[yellow]Access cache is unavailable: %r", e)
+
+        if self.__validated is not None and result:
+            semaphore = asyncio.Semaphore(self.__manager.fetch_many_concurrency)
+
+            async def is_current(user_id: Any, access: Access) -> bool:
+                async with semaphore:
+                    return await self.__is_current(user_id, custom_meta, access)
+
+            current = await asyncio.gather(*(is_current(user_id, access) for user_id, access in result.items()))
+            result = {user_id: access for (user_id, access), keep in zip(result.items(), current) if keep}
+
+        if missing := [user_id for user_id in user_ids if user_id not in result]:
+            started = self.__fetch_started(*missing)
+            try:
+                fetched = await self.__manager.fetch_many_user_access(missing, custom_meta=custom_meta)
+
+                # Invalidated while being fetched, these are fetched again one by one
+                stale = [user_id for user_id in missing if self.__is_stale(user_id, started)]
+                current = {user_id: fetched[user_id] for user_id in missing if user_id not in stale}
+                result.update(current)
+
+                if self.access_cache is not None:
+                    await self.__cache_many(current, custom_meta, started)
+            finally:
+                self.__fetch_finished(*missing)
+
+            for user_id in stale:
+                result[user_id] = await self.fetch_user_access(user_id, custom_meta=custom_meta)
+
+        return result
+
+    async def check_access_many(self, user_ids: Sequence[Any], permissions: Sequence[str], custom_meta: dict | None = None) -> dict[Any, dict[str, bool]]:
+        """
+        Check permissions of many users at once. For example, to find out which of these users can approve a document.
+        Access of every user is fetched in one batch (see BaseRBACManager.fetch_many_user_access)
+        and permissions are resolved against RBAC Map only once
+
+        :raises ValueError: If permission is not present in RBAC Map
+        :param user_ids: User IDs to check
+        :param permissions: RBAC Permissions to check
+        :param custom_meta: Custom meta dict, passed to the RBAC Manager
+        :return: Dict of [userId, Dict of [rawPermission, Status]] (see RBACGate.check_many)
+        """
+        from undore_rbac.processes.gate import RBACGate
+
+        requirements = self.rbac_map.compile_requirements(permissions)
+        accesses = await self.fetch_many_user_access(user_ids, custom_meta=custom_meta)
+
+        return {
+            user_id: RBACGate(
+                user_permissions=access['permissions'],
+                user_roles=access['roles'],
+                rbac_map=self.rbac_map,
+                custom_user=access['user'],
+                role_layers=self.role_layers,
+                config=self.config
+            ).check_many(requirements)
+            for user_id, access in accesses.items()
+        }
+
+    async def invalidate_user(self, user_id: Any) -> None:
+        """
+        Drop cached access of a user (for every custom_meta)
+        Call it after changing users' permissions or roles. With a shared backend, it affects every worker
+
+        Fetches of this user, which are in progress, are not shared with new callers and are not cached
+        """
+        self.__epoch += 1
+        if user_id in self.__fetching:
+            self.__user_epochs[user_id] = self.__epoch
+
+        for key in [key for key in self.__inflight_fetches if key[0] == user_id]:
+            del self.__inflight_fetches[key]
+
+        if self.access_cache is not None:
+            await self.access_cache.invalidate_user(user_id)
+
+    async def invalidate_role(self, role_id: Any) -> None:
+        """
+        Drop cached access of every user, who has a role
+        Call it after changing role permissions or priority. With a shared backend, it affects every worker
+
+        Members of a role are not known until their access is fetched, so every fetch in progress is treated as invalidated
+        """
+        self.__invalidate_inflight()
+
+        if self.access_cache is not None:
+            await self.access_cache.invalidate_role(role_id)
+
+    async def invalidate_all(self) -> None:
+        """
+        Drop all cached access
+        """
+        self.__invalidate_inflight()
+
+        if self.access_cache is not None:
+            await self.access_cache.invalidate_all()
+
+    def __invalidate_inflight(self) -> None:
+        self.__epoch += 1
+        self.__global_epoch = self.__epoch
+        self.__inflight_fetches.clear()
+
+    @property
+    def cache_stats(self) -> CacheStats | None:
+        """
+        Access cache hit, miss and eviction counters of this worker. None, if cache is disabled or the backend does not count them
+        """
+        return self.access_cache.stats if self.access_cache is not None else None
+
+    def should_log_granted(self) -> bool:
+        """
+        Whether to log an "Access granted" message: INFO level is enabled and the message is sampled (see RBACConfig.log_granted_sample_rate)
+        """
+        if not self.logger.isEnabledFor(logging.INFO):
+            return False
+
+        rate = self.config.log_granted_sample_rate
+        return rate >= 1 or random.random() < rate
+
+    def phase_timer(self) -> PhaseTimer | None:
+        """
+        Timer for phases of an access check (see record_check). None, if neither metrics, nor slow check logging are enabled
+        """
+        return PhaseTimer() if self.__instrumented else None
+
+    def record_check(self, timer: PhaseTimer, request_url: str, user_id: Any, permissions: Sequence[str], missing_permission: str | None) -> None:
+        """
+        Record phase durations and decision of an access check, and log it, if it is slow (see RBACMetricsConfig)
+
+        :param timer: Timer of this check (see phase_timer)
+        :param permissions: Required permissions
+        :param missing_permission: Missing permission, if access was denied
+        """
+        total = timer.total
+
+        if self.metrics is not None:
+            for phase, seconds in timer.phases:
+                self.metrics.observe(phase, seconds)
+            self.metrics.observe(PHASE_TOTAL, total)
+
+            self.metrics.record_decision(permissions if missing_permission is None else (missing_permission,), missing_permission is None)
+
+        threshold = self.config.metrics_config.slow_check_threshold
+        if threshold is not None and total >= threshold:
+            phases = ", ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in timer.phases)
+            self.logger.warning("[yellow]Slow access check for user id=%s on %s: %.1fms (%s)", user_id, request_url, total * 1000, phases,
+                                extra={"user_id": user_id, "request_url": request_url, "duration_ms": total * 1000})
+
+    def export_metrics(self) -> str:
+        """
+        Metrics and cache stats in Prometheus text exposition format. Serve it from your metrics endpoint
+
+        :raises RuntimeError: If metrics are disabled (see RBACMetricsConfig)
+        """
+        if self.metrics is None:
+            raise RuntimeError("RBAC metrics are disabled. See RBACMetricsConfig docs for details")
+
+        caches = {"role_layers": self.role_layers.stats}
+        if self.access_cache is not None and (access_stats := self.access_cache.stats) is not None:
+            caches["access"] = access_stats
+        if self.authorization_cache is not None:
+            caches["authorization"] = self.authorization_cache.stats
+
+        return self.metrics.export_prometheus(caches)
 
     @deprecated("Use gate.check_access instead")
     async def check_access(self, request_url: str, user_id: str, permissions: list[str], custom_meta: dict | None = None) -> RBACGate:
@@ -71,7 +560,8 @@ class RbacService(Service):
         """
         from undore_rbac.processes.gate import RBACGate
 
-        self.logger.debug(f"[bold cyan]Checking permissions for user id={user_id} on [bold magenta]{request_url}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("[bold cyan]Checking permissions for user id=%s on [bold magenta]%s", user_id, request_url)
 
         gate = await RBACGate.from_user_id(user_id, custom_meta=custom_meta)
 
@@ -79,6 +569,83 @@ class RbacService(Service):
         if access_status is False:
             raise InsufficientPermissions(request_url, (denial_reason.permission if self.config.exception_handler_config.expose_missing_permission else None))
 
-        self.logger.info(f"[green]Access granted for user id={user_id}")
+        if self.should_log_granted():
+            self.logger.info("[green]Access granted for user id=%s", user_id, extra={"user_id": user_id, "request_url": request_url})
 
         return gate
+
+
+def _access_expiry(access: Access) -> float | None:
+    """
+    Earliest expiry of permissions, which are not expired yet, as a unix timestamp
+    """
+    now = time.time()
+    expiries = [
+        timestamp for permission in map(as_permission_record, access['permissions'])
+        if permission.expires_at is not None and (timestamp := expiry_timestamp(permission.expires_at)) > now
+    ]
+    return min(expiries, default=None)
+
+
+_UNHASHABLE = object()  # custom_meta, which can not be a part of a cache key
+
+
+def _frozen_meta(custom_meta: dict | None) -> Hashable:
+    """
+    freeze(custom_meta), or _UNHASHABLE if it holds unhashable values (for example, a non-frozen pydantic model)
+    """
+    try:
+        frozen = freeze(custom_meta)
+        hash(frozen)
+    except TypeError:
+        return _UNHASHABLE
+
+    return frozen
+
+
+def _version_key(version: Any) -> str:
+    """
+    Access version in the form it has after a round trip through JSON (see RedisCacheBackend), so a datetime matches its string
+    """
+    return json.dumps(version, separators=(",", ":"), default=str)
+
+
+_FETCH_ATTEMPTS = 3  # Fetches of access, which was invalidated during every attempt, give up waiting for a stable result
+
+
+class _Authorization(NamedTuple):
+    user_id: Any
+
+
+class _AuthorizationFailure(NamedTuple):
+    exception: BaseException
+
+
+def _detached(exception: BaseException) -> BaseException:
+    """
+    Copy of an exception without traceback, context and cause.
+    Its constructor is not called, because it may require keyword arguments (for example, HTTPException(status_code=401))
+    """
+    clone = type(exception).__new__(type(exception), *exception.args)
+    clone.args = exception.args
+    clone.__dict__.update(exception.__dict__)
+    return clone
+
+
+def _token_expiry(token: str) -> float | None:
+    """
+    exp claim of a JWT as a unix timestamp, or None if token is not a JWT or has no exp.
+    Signature is not verified, the value is only used to limit cache lifetime
+    """
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+    except ValueError:
+        return None
+
+    expires_at = payload.get("exp") if isinstance(payload, dict) else None
+    return float(expires_at) if isinstance(expires_at, (int, float)) and not isinstance(expires_at, bool) else None
+
@@ -1,32 +1,497 @@
+import json
+import os
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from types import MappingProxyType
+from typing import Callable, Iterable, Iterator, Mapping, NamedTuple
+
 from undore_rbac.interfaces.permissions import IRawRBACPermission, IRawRBACPermissionConfig
 from undore_rbac.rbac_default_map import DEFAULT_RBAC_MAP
+from undore_rbac.types.requirements import RBACRequirement, RBACRequirements
+from undore_rbac.utils.bitset import mask_of
+from undore_rbac.utils.map_cache import MapCache
 from undore_rbac.utils.yaml_reader import YAMLReader
 
-# TODO: ADD FOLDER MAPS SUPPORT
+MAP_FILE_EXTENSIONS = (".yml", ".yaml")
+DEFAULT_MAP_SOURCE = "<default>"
+WILDCARD_MASKS_MAX_SIZE = 4096  # Distinct wildcard tables come from roles, so only a few of them are used in practice
+
+
+class RBACMapDiff(NamedTuple):
+    """
+    Difference between two versions of RBAC Map (see RBACMap.diff)
+    """
+    added: frozenset[str]
+    removed: frozenset[str]
+    changed: frozenset[str]  # Permissions with a different _config (default, explicit or children)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+class RBACMapSources(NamedTuple):
+    """
+    Copy of compiled sources of a map, taken to build its next version (see RBACMap.reloader)
+    """
+    compiled: dict[str, tuple[str, list[IRawRBACPermission]]]  # Source name -> (digest, permissions)
+    pending_namespaces: frozenset[str]  # Namespaces, which were not loaded yet
 
 
 class RBACMap(list):
     """
     RBAC map is a list of permissions, collected from YAML rbac_map file.
     It contains converted and parsed via YAMLReader values
+
+    Map can also be a folder of YAML files, one per namespace (for example, users.yml holds users and users.* permissions).
+    Namespaces can be loaded lazily: then a namespace is read on first lookup of its permission, and iterating
+    over the map only yields namespaces loaded so far (see load_all)
+
+    Lookups by permission name go through an index, which is only ever extended.
+    Every unique permission also gets a stable ordinal (bit position), used by compiled RBACSnapshot bitsets
     """
-    def __init__(self, map_path: str):
+    def __init__(self, map_path: str, cache_path: str | None = None, lazy: bool = False, previous: RBACMapSources | None = None):
         """
         Reads and flattens permission map
-        :param map_path: Path to rbac_map.yml file
+        :param map_path: Path to rbac_map.yml file or to a folder of namespace YAML files
+        :param cache_path: Optional path to a compiled map cache file (see MapCache). Used while map sources are unchanged
+        :param lazy: Only for folder maps. If True, load namespaces on first use, otherwise load all of them right away
+        :param previous: Sources of the previous version of this map (see reloader). Unchanged ones are reused instead of being parsed again
+        :raises ValueError: If a permission is defined in more than one file of a folder map.
+        With lazy loading, only conflicts of file names are found here, others are raised on first use (see load_namespace)
         """
-        permission_map = DEFAULT_RBAC_MAP | YAMLReader.read_yaml(map_path)
-        self.__validate_permissions(permission_map)
+        super().__init__()
+
+        self.map_path = map_path
+        self.cache_path = cache_path
+        self.lazy = lazy
+        self.generation = 0  # Increased every time new permissions are loaded
+
+        self.__index: dict[str, IRawRBACPermission] = {}
+        self.__ordinals: dict[str, int] = {}
+        self.__sources: dict[str, str] = {}  # Permission -> name of the source it is defined in
+        self.__prefix_masks: dict[tuple[str, ...], int] = {}
+        self.__wildcard_masks: dict[tuple[tuple[str, bool], ...], tuple[int, int]] = {}
+        self.__pending_namespaces: dict[str, list[tuple[str, str]]] = {}  # Namespace -> [(file path, prefix)]
+        self.__cache = MapCache(cache_path) if cache_path else None
+        self.__compiled: dict[str, tuple[str, list[IRawRBACPermission]]] = previous.compiled.copy() if previous else {}  # Source name -> (digest, permissions)
+        self.__children: dict[str, tuple[tuple[str, bool], ...]] = {}  # Permission -> transitive closure of its children
+        self.__unresolved_children: list[str] = []  # Loaded permissions with children, which are not resolved yet
+        self.__acyclic: set[str] = set()
+        self.__resolving_children = False
+
+        self.defaults_mask = 0
+
+        if os.path.isdir(map_path):
+            self.__add(DEFAULT_MAP_SOURCE, self.__flatten_permissions(DEFAULT_RBAC_MAP))
+            self.__pending_namespaces = self.__discover_namespaces(map_path)
+
+            # A file always defines the permission it is named after, so this conflict is found without reading it, even if loading is lazy
+            for files in self.__pending_namespaces.values():
+                for path, prefix in files:
+                    if prefix in self.__index:
+                        raise ValueError(f"Permission {prefix} is defined in both {self.__sources[prefix]} and {self.__source_name(path)}")
+
+            if not lazy:
+                self.load_all()
+            elif previous:
+                # Keep namespaces, which were in use, loaded
+                for namespace in sorted(self.__pending_namespaces.keys() - previous.pending_namespaces):
+                    self.load_namespace(namespace)
+        else:
+            self.__add(os.path.basename(map_path), self.__compile_source(map_path))
+
+        self.__resolve_children()
+
+        if self.__cache:
+            self.__cache.flush()
+
+    @property
+    def index(self) -> Mapping[str, IRawRBACPermission]:
+        """
+        Read-only mapping of [rawPermission, IRawRBACPermission]
+        """
+        return MappingProxyType(self.__index)
+
+    @property
+    def pending_namespaces(self) -> tuple[str, ...]:
+        """
+        Namespaces of a lazy folder map, which are not loaded yet
+        """
+        return tuple(self.__pending_namespaces)
+
+    def source_of(self, permission: str) -> str | None:
+        """
+        :return: Name of the source (file) a permission is defined in
+        """
+        return self.__sources.get(permission)
+
+    def children_of(self, permission: str) -> tuple[tuple[str, bool], ...]:
+        """
+        Every permission, which is applied with a permission (when its value is True): its children, their children and so on.
+        Children of a child are only followed, if the child is given with True value.
+        Closer children go first, so if a permission is reached twice, the first value must win (same as in RBACGate)
+
+        :return: Tuple of [rawPermission, value] pairs. Empty, if permission has no children or is not present in RBAC Map
+        """
+        return self.__children.get(permission, ())
+
+    def ordinal(self, permission: str) -> int | None:
+        """
+        :return: Stable bit position of a permission, or None if it is not present in RBAC Map
+        """
+        if (ordinal := self.__ordinals.get(permission)) is None and self.__load_namespace_of(permission):
+            ordinal = self.__ordinals.get(permission)
+
+        return ordinal
+
+    def prefix_mask(self, prefix: tuple[str, ...]) -> int:
+        """
+        Bitset of every non-explicit permission, covered by a wildcard with given prefix.
+        For example, prefix ("users",) of users.* covers users.view and users.view.other, but not users itself
+
+        :param prefix: Wildcard segments before *
+        """
+        if not prefix:
+            self.load_all()
+        elif prefix[0] in self.__pending_namespaces:
+            self.load_namespace(prefix[0])
+
+        if (mask := self.__prefix_masks.get(prefix)) is not None:
+            return mask
+
+        depth = len(prefix)
+        mask = mask_of(
+            (
+                self.__ordinals[permission] for permission, entry in self.__index.items()
+                if not entry.config.explicit and permission.count(".") >= depth and tuple(permission.split(".")[:depth]) == prefix
+            ),
+            len(self.__ordinals)
+        )
+
+        self.__prefix_masks[prefix] = mask
+        return mask
+
+    def wildcard_masks(self, wildcards: tuple[tuple[str, bool], ...]) -> tuple[int, int]:
+        """
+        Permissions, covered by wildcards (see prefix_mask). If several wildcards cover a permission, the first one of them wins.
+        Shared by every user with the same wildcards, for example, given by the same roles
+
+        :param wildcards: Wildcards (* permissions) with values, sorted by priority (most important are first)
+        :return: Tuple of [allowed, covered]: bitset of permissions covered by a wildcard with True value, and by any wildcard
+        """
+        if (masks := self.__wildcard_masks.get(wildcards)) is not None:
+            return masks
+
+        allowed = covered = 0
+        for wildcard, value in wildcards:
+            prefix = wildcard.split(".")
+            wildcard_mask = self.prefix_mask(tuple(prefix[:prefix.index("*")]) if "*" in prefix else tuple(prefix)) & ~covered
+            covered |= wildcard_mask
+
+            if value:
+                allowed |= wildcard_mask
+
+        masks = allowed, covered
+        if len(self.__wildcard_masks) < WILDCARD_MASKS_MAX_SIZE:
+            self.__wildcard_masks[wildcards] = masks
+
+        return masks
+
+    def reload(self) -> "RBACMap":
+        """
+        Read the map sources again. This map is not changed, so it can still be used until the new one replaces it
+
+        Only changed sources (files of a folder map) are parsed and flattened again
+        :raises ValueError: If new map is invalid
+        :return: New RBAC Map
+        """
+        return self.reloader()()
+
+    def reloader(self) -> Callable[[], "RBACMap"]:
+        """
+        Same as reload, split in two: sources of this map are copied right away, and the new map is read by the returned function.
+        So it can be called in another thread, while this map keeps loading namespaces in the current one
+        """
+        sources = RBACMapSources(self.__compiled.copy(), frozenset(self.__pending_namespaces))
+        return partial(RBACMap, self.map_path, cache_path=self.cache_path, lazy=self.lazy, previous=sources)
+
+    def diff(self, previous: "RBACMap") -> RBACMapDiff:
+        """
+        Compare loaded permissions with a previous version of the map
+
+        :param previous: Previous RBAC Map
+        """
+        permissions, previous_permissions = self.__index.keys(), previous.__index.keys()
+
+        return RBACMapDiff(
+            added=frozenset(permissions - previous_permissions),
+            removed=frozenset(previous_permissions - permissions),
+            changed=frozenset(
+                i for i in permissions & previous_permissions
+                if self.__config_key(self.__index[i].config) != self.__config_key(previous.__index[i].config)
+                or self.children_of(i) != previous.children_of(i)
+            )
+        )
+
+    def load_namespace(self, namespace: str) -> None:
+        """
+        Load a namespace of a lazy folder map. Does nothing, if it is already loaded.
+        If loading fails, the map is left unchanged and the namespace stays pending
+
+        :raises ValueError: If a permission is defined in more than one file, or children have a cycle
+        """
+        if (files := self.__pending_namespaces.get(namespace)) is None:
+            return
+
+        with self.__loading():
+            self.__add_namespace([(path, self.__compile_source(path, prefix)) for path, prefix in files])
+            del self.__pending_namespaces[namespace]
+
+            self.__resolve_children()
+
+        if self.__cache:
+            self.__cache.flush()
+
+    def load_all(self) -> None:
+        """
+        Load every pending namespace of a lazy folder map.
+        If loading fails, the map is left unchanged
+
+        :raises ValueError: If a permission is defined in more than one file, or children have a cycle
+        """
+        if not self.__pending_namespaces:
+            return
+
+        with self.__loading():
+            for namespace in sorted(self.__pending_namespaces):
+                self.__add_namespace([(path, self.__compile_source(path, prefix)) for path, prefix in self.__pending_namespaces[namespace]])
+                del self.__pending_namespaces[namespace]
+
+            self.__resolve_children()
+
+        if self.__cache:
+            self.__cache.flush()
+
+    @contextmanager
+    def __loading(self) -> Iterator[None]:
+        """
+        Permissions, added inside, are removed again if loading fails (a conflict or a children cycle),
+        so a half-loaded namespace is never used and its children are never lost
+        """
+        length, count = len(self), len(self.__ordinals)
+        pending, unresolved = self.__pending_namespaces.copy(), self.__unresolved_children.copy()
+
+        try:
+            yield
+        except BaseException:
+            # Permissions are only ever added, and ordinals are given in order, so the newest ones are the last
+            while len(self.__ordinals) > count:
+                permission, _ = self.__ordinals.popitem()
+                del self.__index[permission], self.__sources[permission]
+                self.__children.pop(permission, None)
+                self.__acyclic.discard(permission)
+
+            list.__delitem__(self, slice(length, None))
+            self.__pending_namespaces, self.__unresolved_children = pending, unresolved
 
+            self.defaults_mask &= (1 << count) - 1
+            self.__prefix_masks.clear()
+            self.__wildcard_masks.clear()
+            self.generation += 1
+            raise
+
+    def __load_namespace_of(self, permission: str) -> bool:
+        if not self.__pending_namespaces:
+            return False
+
+        namespace = permission.split(".", 1)[0]
+        if namespace not in self.__pending_namespaces:
+            return False
+
+        self.load_namespace(namespace)
+        return True
+
+    @staticmethod
+    def __discover_namespaces(path: str) -> dict[str, list[tuple[str, str]]]:
+        namespaces: dict[str, list[tuple[str, str]]] = {}
+        prefixes: dict[str, str] = {}  # Prefix -> file name
+
+        for name in sorted(os.listdir(path)):
+            prefix, extension = os.path.splitext(name)
+            file_path = os.path.join(path, name)
+
+            if extension not in MAP_FILE_EXTENSIONS or not os.path.isfile(file_path):
+                continue
+
+            if not prefix or "*" in prefix:
+                raise ValueError(f"Invalid RBAC Map namespace file name: {name}")
+
+            if (other := prefixes.setdefault(prefix, name)) != name:
+                raise ValueError(f"Permission {prefix} is defined in both {other} and {name}")
+
+            # users.admin.yml belongs to the users namespace and holds users.admin permissions
+            namespaces.setdefault(prefix.split(".", 1)[0], []).append((file_path, prefix))
+
+        return namespaces
+
+    def __compile_source(self, path: str, prefix: str | None = None) -> list[IRawRBACPermission]:
+        """
+        Read and flatten a single YAML source, or take it from cache
+
+        :param prefix: Permission prefix of a namespace file. If None, the source is a whole rbac map, merged with the default one
+        """
+        with open(path, "rb") as f:
+            source = f.read()
+
+        name = self.__source_name(path)
+        digest = MapCache.digest(source, prefix.encode() if prefix is not None else json.dumps(DEFAULT_RBAC_MAP, sort_keys=True).encode())
+
+        if (compiled := self.__compiled.get(name)) is not None and compiled[0] == digest:
+            return compiled[1]
+
+        if self.__cache and (permissions := self.__cache.load(name, digest)) is not None:
+            self.__compiled[name] = digest, permissions
+            return permissions
+
+        content = YAMLReader.parse_yaml(source)
+
+        if prefix is None:
+            permission_map = DEFAULT_RBAC_MAP | (content or {})
+        else:
+            permission_map = {prefix: content}
+
+        self.__validate_permissions(permission_map)
         permissions = self.__flatten_permissions(permission_map)
 
-        super().__init__(permissions)
+        if self.__cache:
+            self.__cache.store(name, digest, permissions)
+
+        self.__compiled[name] = digest, permissions
+        return permissions
+
+    @staticmethod
+    def __config_key(config: IRawRBACPermissionConfig) -> tuple:
+        return config.default, config.explicit, tuple((i.permission, i.value) for i in config.children or [])
+
+    def __source_name(self, path: str) -> str:
+        if os.path.isdir(self.map_path):
+            return os.path.relpath(path, self.map_path)
+        return os.path.basename(path)
+
+    def __add_namespace(self, sources: list[tuple[str, list[IRawRBACPermission]]]) -> None:
+        # Check every file of a namespace before adding any of them, so a conflict leaves the map unchanged
+        defined: dict[str, str] = {}
+
+        for path, permissions in sources:
+            name = self.__source_name(path)
+
+            for permission in permissions:
+                other = self.__sources.get(permission.permission) or defined.get(permission.permission)
+                if other is not None and other != name:
+                    raise ValueError(f"Permission {permission.permission} is defined in both {other} and {name}")
+
+                defined.setdefault(permission.permission, name)
+
+        for path, permissions in sources:
+            self.__add(self.__source_name(path), permissions)
+
+    def __add(self, source: str, permissions: list[IRawRBACPermission]) -> None:
+        defaults: list[int] = []
 
-    def __validate_permissions(self, permissions: list[str]) -> bool:
         for permission in permissions:
-            if "*" in permission:
+            if permission.permission in self.__index:
+                # Defined twice in one source. Keep the first definition, same as the linear lookup did
+                continue
+
+            ordinal = len(self.__ordinals)
+
+            self.__index[permission.permission] = permission
+            self.__ordinals[permission.permission] = ordinal
+            self.__sources[permission.permission] = source
+
+            if permission.config.children:
+                self.__unresolved_children.append(permission.permission)
+            if permission.config.default:
+                defaults.append(ordinal)
+
+        list.extend(self, permissions)
+
+        self.defaults_mask |= mask_of(defaults, len(self.__ordinals))
+
+        # New permissions may be covered by already calculated wildcards
+        self.__prefix_masks.clear()
+        self.__wildcard_masks.clear()
+        self.generation += 1
+
+    def __resolve_children(self) -> None:
+        """
+        Check new permissions for children cycles and calculate their children closures (see children_of)
+
+        :raises ValueError: If children of a permission lead back to it
+        """
+        if self.__resolving_children:
+            # A namespace was loaded while resolving children, its permissions are resolved by the outer call
+            return
+
+        self.__resolving_children = True
+        try:
+            resolved = []
+            while self.__unresolved_children:
+                permission = self.__unresolved_children.pop()
+                self.__check_cycles(permission, [])
+                resolved.append(permission)
+
+            for permission in resolved:
+                self.__children[permission] = self.__closure(permission)
+        finally:
+            self.__resolving_children = False
+
+    def __check_cycles(self, permission: str, path: list[str]) -> None:
+        if permission in self.__acyclic:
+            return
+
+        if permission in path:
+            cycle = path[path.index(permission):] + [permission]
+            raise ValueError(f"RBAC Map children have a cycle: {' -> '.join(cycle)}")
+
+        # Loads the namespace of a child, if needed, so closures can be calculated
+        if (entry := self.find(permission)) is not None and entry.config.children:
+            path.append(permission)
+            for child in entry.config.children:
+                if child.value:
+                    self.__check_cycles(child.permission, path)
+            path.pop()
+
+        self.__acyclic.add(permission)
+
+    def __closure(self, permission: str) -> tuple[tuple[str, bool], ...]:
+        closure: dict[str, bool] = {}
+        queue = deque([permission])
+
+        while queue:
+            entry = self.__index.get(queue.popleft())
+            if entry is None:
+                continue
+
+            for child in entry.config.children or []:
+                if child.permission in closure:
+                    continue
+
+                closure[child.permission] = child.value
+                if child.value:
+                    queue.append(child.permission)
+
+        return tuple(closure.items())
+
+    def __validate_permissions(self, permissions: dict) -> bool:
+        for permission, value in permissions.items():
+            if "*" in str(permission):
                 raise ValueError("Cannot have permission overrides in RBAC Map")
 
+            if isinstance(value, dict):
+                self.__validate_permissions({k: v for k, v in value.items() if k != "_config"})
+
         return True
 
     def __flatten_permissions(self, d, prefix: str = "") -> list[IRawRBACPermission]:
@@ -80,7 +545,61 @@ class RBACMap(list):
     def extend(self, __object):
         raise ValueError("RBACMap is read-only")
 
+    def remove(self, __value):
+        raise ValueError("RBACMap is read-only")
+
+    def clear(self):
+        raise ValueError("RBACMap is read-only")
+
+    def sort(self, *args, **kwargs):
+        raise ValueError("RBACMap is read-only")
+
+    def reverse(self):
+        raise ValueError("RBACMap is read-only")
+
+    def __setitem__(self, __index, __value):
+        raise ValueError("RBACMap is read-only")
+
+    def __delitem__(self, __index):
+        raise ValueError("RBACMap is read-only")
+
+    def __iadd__(self, __value):
+        raise ValueError("RBACMap is read-only")
+
+    def __imul__(self, __value):
+        raise ValueError("RBACMap is read-only")
+
+    def __contains__(self, item) -> bool:
+        if isinstance(item, str):
+            return self.find(item) is not None
+        return super().__contains__(item)
+
     def find(self, permission: str) -> IRawRBACPermission | None:
-        result = [i for i in self if i == permission]
+        if (entry := self.__index.get(permission)) is None and self.__load_namespace_of(permission):
+            entry = self.__index.get(permission)
+
+        return entry
+
+    def compile_requirements(self, permissions: Iterable[str]) -> RBACRequirements:
+        """
+        Resolve required permissions against RBAC Map once, so they can be checked without any lookups later
+
+        :param permissions: Required permissions in RBACMap format (for example: test.modify)
+        :raises ValueError: If permission is not present in RBAC Map
+        :return: Compiled requirements, bound to this RBAC Map
+        """
+        requirements = []
+
+        for permission in permissions:
+            if not (entry := self.find(permission)):
+                raise ValueError(f"Permission {permission} is not present in RBAC Map")
+
+            requirements.append(
+                RBACRequirement(
+                    permission=entry.permission,
+                    ordinal=self.__ordinals[entry.permission],
+                    entry=entry
+                )
+            )
 
-        return result[0] if result else None
+        return RBACRequirements(self, tuple(requirements), mask_of((i.ordinal for i in requirements), len(self.__ordinals)))
@@ -0,0 +1,47 @@
+from typing import NamedTuple, Iterator, TYPE_CHECKING
+
+from undore_rbac.interfaces.permissions import IRawRBACPermission
+
+if TYPE_CHECKING:
+    from undore_rbac.types.rbac_map import RBACMap
+
+
+class RBACRequirement(NamedTuple):
+    """
+    Required permission, resolved against RBAC Map in advance
+    """
+    permission: str
+    ordinal: int
+    entry: IRawRBACPermission
+
+
+class RBACRequirements:
+    """
+    Set of required permissions, compiled once by RBACMap.compile_requirements
+
+    Can be passed to RBACGate.check_access instead of raw permissions
+    to skip RBAC Map lookups and permission parsing on every check.
+    Bound to the RBAC Map it was compiled with
+    """
+    __slots__ = ("rbac_map", "requirements", "mask")
+
+    def __init__(self, rbac_map: "RBACMap", requirements: tuple[RBACRequirement, ...], mask: int):
+        """
+        :param mask: Bitset of requirement ordinals (see RBACMap.ordinal)
+        """
+        self.rbac_map = rbac_map
+        self.requirements = requirements
+        self.mask = mask
+
+    @property
+    def permissions(self) -> tuple[str, ...]:
+        return tuple(i.permission for i in self.requirements)
+
+    def __iter__(self) -> Iterator[RBACRequirement]:
+        return iter(self.requirements)
+
+    def __len__(self) -> int:
+        return len(self.requirements)
+
+    def __repr__(self):
+        return f"<RBACRequirements {', '.join(self.permissions)}>"
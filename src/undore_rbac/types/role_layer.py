@@ -0,0 +1,69 @@
+from typing import Hashable, Sequence, TYPE_CHECKING
+
+from undore_rbac.interfaces.permissions import IRBACPermission, IRBACRole, PermissionRecord, RoleRecord
+
+if TYPE_CHECKING:
+    from undore_rbac.types.rbac_map import RBACMap
+
+
+class RoleLayer:
+    """
+    Contribution of a single role to user permissions: validated role permissions and their children (see RBACMap.children_of).
+
+    Role permissions are the same for every member of a role, so a layer is compiled once
+    and shared between gates of every user with this role (see RbacService.role_layers)
+    """
+    __slots__ = ("role_id", "rbac_map", "permissions", "children")
+
+    def __init__(self, role_id: object, rbac_map: "RBACMap", permissions: tuple[tuple[str, bool], ...], children: tuple[tuple[str, bool], ...]):
+        self.role_id = role_id
+        self.rbac_map = rbac_map
+        self.permissions = permissions
+        self.children = children
+
+    @staticmethod
+    def key(role: IRBACRole | RoleRecord, permissions: Sequence[IRBACPermission | PermissionRecord], expiring: int = 0) -> Hashable:
+        """
+        Cache key of a role layer. Role version is used, if provided, otherwise role permissions themselves
+
+        :param role: Role to compile
+        :param permissions: Permissions of this role, which are not expired
+        :param expiring: Amount of these permissions, which have expires_at. Permissions only expire over time,
+        so within the same role version it changes whenever one of them expires
+        """
+        if (version := getattr(role, "version", None)) is not None:
+            return (role.id, version, expiring) if expiring else (role.id, version)
+
+        return role.id, tuple((i.permission, i.value) for i in permissions)
+
+    @classmethod
+    def compile(cls, role_id: object, permissions: Sequence[IRBACPermission | PermissionRecord], rbac_map: "RBACMap") -> "RoleLayer":
+        """
+        :param role_id: Role ID
+        :param permissions: Permissions of this role, newer ones first
+        :param rbac_map: RBAC Map to validate permissions and take children from
+        :raises ValueError: If permission is invalid
+        """
+        role_permissions: dict[str, bool] = {}
+        children: list[tuple[str, bool]] = []
+
+        for permission in permissions:
+            map_permission = rbac_map.find(permission.permission)
+            if not map_permission and not permission.permission.endswith("*"):
+                raise ValueError(f"Permission {permission.permission} not found in RBAC Map")
+            elif map_permission and permission.value is True:
+                children.extend(rbac_map.children_of(permission.permission))
+
+            if permission.permission not in role_permissions:
+                role_permissions[permission.permission] = permission.value
+
+        return cls(role_id, rbac_map, tuple(role_permissions.items()), tuple(children))
+
+    def rebind(self, rbac_map: "RBACMap") -> "RoleLayer":
+        """
+        Same layer, bound to another version of RBAC Map. Only valid if none of layer permissions were changed or removed there
+        """
+        return RoleLayer(self.role_id, rbac_map, self.permissions, self.children)
+
+    def __repr__(self):
+        return f"<RoleLayer role_id={self.role_id} permissions={len(self.permissions)} children={len(self.children)}>"
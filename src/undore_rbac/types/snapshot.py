@@ -0,0 +1,141 @@
+from typing import Sequence, TYPE_CHECKING
+
+from undore_rbac.exceptions import InsufficientPermissions
+from undore_rbac.interfaces.permissions import IRawRBACPermission
+from undore_rbac.types.requirements import RBACRequirements
+from undore_rbac.utils.bitset import mask_of
+
+if TYPE_CHECKING:
+    from undore_rbac.types.rbac_map import RBACMap
+
+
+class RBACSnapshot:
+    """
+    Compiled access of a user: bitsets over RBAC Map ordinals (see RBACMap.ordinal) and a small wildcard table.
+
+    Much smaller than RBACGate and its permission lists, so it can be kept alive for a long time (for example, for websocket sessions).
+    Only permissions of the user itself are stored: defaults and wildcard masks are shared by every user, so they are taken
+    from the RBAC Map on every check (see RBACMap.defaults_mask and RBACMap.wildcard_masks).
+    Checking compiled RBACRequirements is a couple of integer mask operations.
+    Bound to the RBAC Map it was compiled with. If the map loads more namespaces later (see RBACMap lazy loading),
+    wildcard masks are taken again on the next check
+
+    A snapshot does not know permission records, so it can not drop a permission, which expires (see IRBACPermission.expires_at).
+    It is stale after expires_at: compile it again (for example, take RBACGate.snapshot again) by then
+    """
+    __slots__ = ("rbac_map", "granted", "denied", "wildcards", "wildcard_masks", "generation", "expires_at")
+
+    def __init__(self, rbac_map: "RBACMap", granted: int, denied: int, wildcards: tuple[tuple[str, bool], ...], expires_at: float | None = None):
+        """
+        :param granted: Bitset of permissions, which user has with True value
+        :param denied: Bitset of permissions, which user has with False value
+        :param wildcards: Wildcards (* permissions) with values, sorted by priority (most important are first)
+        :param expires_at: Unix timestamp of the earliest expiry of compiled permissions, or None if none of them expire
+        """
+        self.rbac_map = rbac_map
+        self.granted = granted
+        self.denied = denied
+        self.wildcards = wildcards
+        self.expires_at = expires_at
+
+        # Taken first: a wildcard may load more namespaces of a lazy map
+        self.wildcard_masks = rbac_map.wildcard_masks(wildcards) if wildcards else None
+        self.generation = rbac_map.generation
+
+    def allowed(self, mask: int) -> int:
+        """
+        :param mask: Bitset of permissions to check
+        :return: Bits of mask, which are allowed for the user
+        """
+        rbac_map = self.rbac_map
+
+        # x ^ (x & y) is x without y, limited to the width of mask (x & ~y would be as wide as y)
+        defaults = rbac_map.defaults_mask & mask
+        allowed = self.granted & mask | defaults ^ (defaults & self.denied)
+
+        if self.wildcard_masks is not None:
+            if self.generation != rbac_map.generation:
+                self.wildcard_masks = rbac_map.wildcard_masks(self.wildcards)
+                self.generation = rbac_map.generation
+
+            # Wildcards win over values of permissions
+            wildcard_allowed, wildcard_covered = self.wildcard_masks
+            allowed = allowed ^ (allowed & wildcard_covered) | wildcard_allowed & mask
+
+        return allowed
+
+    @classmethod
+    def compile(cls, rbac_map: "RBACMap", user_permissions: dict[str, bool], expires_at: float | None = None) -> "RBACSnapshot":
+        """
+        :param rbac_map: RBAC Map to take ordinals from
+        :param user_permissions: Merged user permissions, sorted by priority (see RBACGate.user_permissions_dict)
+        :param expires_at: Unix timestamp of the earliest expiry of user_permissions (see RBACGate.expires_at)
+        """
+        granted: list[int] = []
+        denied: list[int] = []
+        wildcards: list[tuple[str, bool]] = []
+
+        for permission, value in user_permissions.items():
+            if permission.endswith("*"):
+                wildcards.append((permission, value))
+            elif (ordinal := rbac_map.ordinal(permission)) is not None:
+                (granted if value else denied).append(ordinal)
+
+        size = len(rbac_map.index)
+        return cls(rbac_map, mask_of(granted, size), mask_of(denied, size), tuple(wildcards), expires_at)
+
+    def has(self, permission: str) -> bool:
+        """
+        :raises ValueError: If permission is not present in RBAC Map
+        :return: Whether access to a single permission is granted
+        """
+        if (ordinal := self.rbac_map.ordinal(permission)) is None:
+            raise ValueError(f"Permission {permission} is not present in RBAC Map")
+
+        return bool(self.allowed(1 << ordinal))
+
+    def check_access(self, required_permissions: str | Sequence[str] | RBACRequirements, auto_error: bool = True) -> tuple[bool, IRawRBACPermission | None]:
+        """
+        Same as RBACGate.check_access
+
+        :raises ValueError: If permission is not present in RBAC Map
+        :raises InsufficientPermissions: If auto_error is True and access is denied
+
+        :param auto_error: If True, will raise InsufficientPermissions if missing permissions
+        :param required_permissions: RBAC Permission(s) or compiled RBACRequirements to check
+        :return: Tuple of [Status, Reason]
+        """
+        required_permissions = self.__requirements(required_permissions)
+
+        if not (missing := required_permissions.mask & ~self.allowed(required_permissions.mask)):
+            return True, None
+
+        # Report the first missing permission in order of requirements
+        requirement = next(i for i in required_permissions if missing >> i.ordinal & 1)
+
+        if auto_error:
+            raise InsufficientPermissions(required_permission=requirement.permission)
+        return False, requirement.entry
+
+    def check_many(self, permissions: Sequence[str] | RBACRequirements) -> dict[str, bool]:
+        """
+        Same as RBACGate.check_many
+        """
+        requirements = self.__requirements(permissions)
+        allowed = self.allowed(requirements.mask)
+        return {i.permission: bool(allowed >> i.ordinal & 1) for i in requirements}
+
+    def __requirements(self, permissions: str | Sequence[str] | RBACRequirements) -> RBACRequirements:
+        if not isinstance(permissions, RBACRequirements):
+            if isinstance(permissions, str):
+                permissions = (permissions,)
+            permissions = self.rbac_map.compile_requirements(permissions)
+
+        if permissions.rbac_map is not self.rbac_map:
+            # Compiled against another RBAC Map, resolve again
+            permissions = self.rbac_map.compile_requirements(permissions.permissions)
+
+        return permissions
+
+    def __repr__(self):
+        return f"<RBACSnapshot granted={self.granted.bit_count()} denied={self.denied.bit_count()} wildcards={len(self.wildcards)}>"
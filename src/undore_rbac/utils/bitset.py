@@ -0,0 +1,16 @@
+from typing import Iterable
+
+
+def mask_of(ordinals: Iterable[int], size: int) -> int:
+    """
+    Build an integer bitset from permission ordinals in linear time
+
+    :param ordinals: Ordinals (bit positions) to set
+    :param size: Total amount of ordinals
+    """
+    bits = bytearray((size + 7) // 8)
+
+    for ordinal in ordinals:
+        bits[ordinal >> 3] |= 1 << (ordinal & 7)
+
+    return int.from_bytes(bits, "little")
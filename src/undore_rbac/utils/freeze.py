@@ -0,0 +1,14 @@
+from typing import Any, Hashable
+
+
+def freeze(value: Any) -> Hashable:
+    """
+    Hashable version of a JSON-like value (for example, custom_meta), to be used as a cache key
+    """
+    if isinstance(value, dict):
+        return frozenset((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(i) for i in value)
+    if isinstance(value, set):
+        return frozenset(freeze(i) for i in value)
+    return value
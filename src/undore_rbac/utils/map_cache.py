@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Iterable
+
+from undore_rbac.interfaces.permissions import IRawRBACPermission, IRawRBACPermissionConfig, IRBACChildPermission
+
+CACHE_FORMAT_VERSION = 2
+
+
+class MapCache:
+    """
+    Compiled RBAC Map cache file, so worker processes do not parse and flatten YAML on every boot.
+
+    Every YAML source (rbac map file, or a namespace file of a folder map) is cached separately and keyed by its content hash:
+    if a source changes, only this source is parsed again. A missing or broken cache file is never an error
+    """
+    def __init__(self, path: str):
+        """
+        :param path: Path to the cache file. Its directory must exist
+        """
+        self.path = path
+        self.__sources: dict[str, dict] | None = None
+        self.__dirty = False
+
+    @staticmethod
+    def digest(*sources: bytes) -> str:
+        """
+        Content hash of an RBAC Map source
+        """
+        sha = hashlib.sha256(f"undore_rbac:{CACHE_FORMAT_VERSION}".encode())
+
+        for source in sources:
+            sha.update(len(source).to_bytes(8, "little"))
+            sha.update(source)
+
+        return sha.hexdigest()
+
+    def load(self, source: str, digest: str) -> list[IRawRBACPermission] | None:
+        """
+        :param source: Source name
+        :param digest: Content hash of the source (see MapCache.digest)
+        :return: Compiled permissions, or None if cache is missing, broken or stale
+        """
+        artifact = self.__artifact().get(source)
+
+        if not isinstance(artifact, dict) or artifact.get("digest") != digest:
+            return None
+
+        try:
+            configs = [self.__load_config(i) for i in artifact["configs"]]
+            # Already validated when the cache was written, skip pydantic validation
+            return [IRawRBACPermission.model_construct(permission=permission, config=configs[config]) for permission, config in artifact["permissions"]]
+        except (KeyError, TypeError, ValueError, IndexError):
+            return None
+
+    def store(self, source: str, digest: str, permissions: Iterable[IRawRBACPermission]) -> None:
+        """
+        Replace a cached source. Written to the file on flush
+
+        :param source: Source name
+        :param digest: Content hash of the source (see MapCache.digest)
+        :param permissions: Compiled permissions
+        """
+        # Most permissions share the same config, so configs are stored once and referenced by index
+        configs: dict[tuple, int] = {}
+        dumped_permissions = []
+
+        for permission in permissions:
+            config = self.__dump_config(permission.config)
+            dumped_permissions.append([permission.permission, configs.setdefault(config, len(configs))])
+
+        self.__artifact()[source] = {
+            "digest": digest,
+            "configs": list(configs),
+            "permissions": dumped_permissions
+        }
+        self.__dirty = True
+
+    def flush(self) -> None:
+        """
+        Atomically replace the cache file, if anything was stored. Failing to write the cache is not an error
+        """
+        if not self.__dirty:
+            return
+
+        artifact = {
+            "version": CACHE_FORMAT_VERSION,
+            "sources": self.__artifact()
+        }
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".rbac_map_cache.")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(json.dumps(artifact, separators=(",", ":")))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            pass
+
+        self.__dirty = False
+
+    def __artifact(self) -> dict[str, dict]:
+        if self.__sources is None:
+            self.__sources = self.__read()
+
+        return self.__sources
+
+    def __read(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "rb") as f:
+                artifact = json.load(f)
+        except (OSError, ValueError):
+            artifact = None
+
+        if isinstance(artifact, dict) and artifact.get("version") == CACHE_FORMAT_VERSION and isinstance(artifact.get("sources"), dict):
+            return artifact["sources"]
+        return {}
+
+    @staticmethod
+    def __dump_config(config: IRawRBACPermissionConfig) -> tuple:
+        return config.default, config.explicit, tuple((i.permission, i.value) for i in config.children or [])
+
+    @staticmethod
+    def __load_config(data: list) -> IRawRBACPermissionConfig:
+        default, explicit, children = data
+
+        return IRawRBACPermissionConfig.model_construct(
+            default=default,
+            explicit=explicit,
+            children=[IRBACChildPermission.model_construct(permission=k, value=v) for k, v in children]
+        )
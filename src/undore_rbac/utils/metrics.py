@@ -0,0 +1,184 @@
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Iterable, Mapping
+
+from undore_rbac.utils.ttl_cache import CacheStats
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+PHASE_AUTHORIZE = "authorize"
+PHASE_FETCH = "fetch_user_access"  # Includes gate construction
+PHASE_COMPILE = "compile"  # Merging user permissions into an RBACSnapshot
+PHASE_CHECK = "check_access"
+PHASE_TOTAL = "total"
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, same as Prometheus one
+    """
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        :param buckets: Sorted upper bounds. +Inf is implied
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """
+        :return: List of [upperBound, observations <= upperBound], last upper bound is +Inf
+        """
+        result = []
+        total = 0
+
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+
+class RBACMetrics:
+    """
+    Authorization pipeline metrics: duration of every phase (see PHASE_*), access decisions per permission.
+    Created by RbacService, if enabled in RBACMetricsConfig.
+
+    Hooks receive every phase duration as it is observed, for example to forward them to your own metrics library:
+    metrics.add_hook(lambda phase, seconds: statsd.timing(f"rbac.{phase}", seconds * 1000))
+    """
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS, track_permissions: bool = True):
+        """
+        :param buckets: Histogram buckets in seconds
+        :param track_permissions: Count decisions per permission
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.track_permissions = track_permissions
+
+        self.phases: dict[str, Histogram] = {}
+        self.decisions: dict[tuple[str, bool], int] = {}  # (permission, granted) -> count
+        self.hooks: list[Callable[[str, float], None]] = []
+
+    def add_hook(self, hook: Callable[[str, float], None]) -> None:
+        """
+        :param hook: Called with (phase, seconds) for every observed phase. Must be fast and must not raise
+        """
+        self.hooks.append(hook)
+
+    def observe(self, phase: str, seconds: float) -> None:
+        if (histogram := self.phases.get(phase)) is None:
+            histogram = self.phases[phase] = Histogram(self.buckets)
+
+        histogram.observe(seconds)
+
+        for hook in self.hooks:
+            hook(phase, seconds)
+
+    def record_decision(self, permissions: Iterable[str], granted: bool) -> None:
+        """
+        :param permissions: Granted permissions, or the missing one, if access was denied
+        :param granted: Whether access was granted
+        """
+        if not self.track_permissions:
+            permissions = ("",)
+
+        for permission in permissions:
+            key = permission, granted
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+
+    def export_prometheus(self, caches: Mapping[str, CacheStats] | None = None) -> str:
+        """
+        Metrics in Prometheus text exposition format
+
+        :param caches: Stats of caches to export as well, by cache name (see RbacService.export_metrics)
+        """
+        lines = [
+            "# HELP undore_rbac_phase_duration_seconds Duration of authorization pipeline phases",
+            "# TYPE undore_rbac_phase_duration_seconds histogram",
+        ]
+
+        for phase, histogram in self.phases.items():
+            phase = _escape(phase)
+
+            for bound, count in histogram.cumulative():
+                lines.append(f'undore_rbac_phase_duration_seconds_bucket{{phase="{phase}",le="{_format_bound(bound)}"}} {count}')
+
+            lines.append(f'undore_rbac_phase_duration_seconds_sum{{phase="{phase}"}} {histogram.sum!r}')
+            lines.append(f'undore_rbac_phase_duration_seconds_count{{phase="{phase}"}} {histogram.count}')
+
+        lines += [
+            "# HELP undore_rbac_decisions_total Access decisions. Denied ones are counted for the missing permission",
+            "# TYPE undore_rbac_decisions_total counter",
+        ]
+
+        for (permission, granted), count in self.decisions.items():
+            lines.append(f'undore_rbac_decisions_total{{permission="{_escape(permission)}",decision="{"granted" if granted else "denied"}"}} {count}')
+
+        if caches:
+            lines += [
+                "# HELP undore_rbac_cache_requests_total Cache lookups",
+                "# TYPE undore_rbac_cache_requests_total counter",
+            ]
+            for name, stats in caches.items():
+                lines.append(f'undore_rbac_cache_requests_total{{cache="{_escape(name)}",result="hit"}} {stats.hits}')
+                lines.append(f'undore_rbac_cache_requests_total{{cache="{_escape(name)}",result="miss"}} {stats.misses}')
+
+            lines += [
+                "# HELP undore_rbac_cache_evictions_total Cache entries dropped because cache was full or they expired",
+                "# TYPE undore_rbac_cache_evictions_total counter",
+            ]
+            for name, stats in caches.items():
+                lines.append(f'undore_rbac_cache_evictions_total{{cache="{_escape(name)}",reason="size"}} {stats.evictions}')
+                lines.append(f'undore_rbac_cache_evictions_total{{cache="{_escape(name)}",reason="ttl"}} {stats.expirations}')
+
+            lines += [
+                "# HELP undore_rbac_cache_size Cache entries",
+                "# TYPE undore_rbac_cache_size gauge",
+            ]
+            for name, stats in caches.items():
+                lines.append(f'undore_rbac_cache_size{{cache="{_escape(name)}"}} {stats.size}')
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        self.phases.clear()
+        self.decisions.clear()
+
+
+class PhaseTimer:
+    """
+    Measures consecutive phases of a single access check
+    """
+    __slots__ = ("phases", "start", "last")
+
+    def __init__(self):
+        self.start = self.last = perf_counter()
+        self.phases: list[tuple[str, float]] = []
+
+    def lap(self, phase: str) -> None:
+        """
+        End a phase, which started when the previous one ended
+        """
+        now = perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    @property
+    def total(self) -> float:
+        return self.last - self.start
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
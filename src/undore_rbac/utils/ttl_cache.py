@@ -0,0 +1,107 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, NamedTuple
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int  # Entries dropped because cache was full
+    expirations: int  # Entries dropped because their TTL ran out
+    size: int
+    max_size: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class TTLCache:
+    """
+    Size-bounded in-process cache with time-to-live.
+    Least recently used entries are evicted first, when the cache is full.
+
+    Not thread-safe, meant to be used from a single event loop
+    """
+    def __init__(self, max_size: int, ttl: float | None = None, clock: Callable[[], float] = time.monotonic):
+        """
+        :param max_size: Maximum amount of entries
+        :param ttl: Default entry lifetime in seconds. If None, entries live until evicted
+        :param clock: Monotonic time source in seconds
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+
+        self.__entries: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.__entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= self.clock():
+            del self.__entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        :param ttl: Entry lifetime in seconds, overrides the default one
+        """
+        ttl = self.ttl if ttl is None else ttl
+
+        self.__entries[key] = (self.clock() + ttl if ttl is not None else None, value)
+        self.__entries.move_to_end(key)
+
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.__entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self.__entries.clear()
+
+    def items(self) -> Iterator[tuple[Hashable, Any]]:
+        """
+        Iterate over a snapshot of entries, including expired ones. Does not affect stats or LRU order
+        """
+        return ((k, v) for k, (_, v) in list(self.__entries.items()))
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self.__entries.get(key)
+        return entry is not None and (entry[0] is None or entry[0] > self.clock())
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            size=len(self.__entries),
+            max_size=self.max_size
+        )
@@ -1,8 +1,15 @@
 import yaml
 
+# LibYAML-based loader is several times faster, if PyYAML was built with it
+_SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 class YAMLReader:
     @staticmethod
     def read_yaml(path: str) -> dict:
-        with open(path) as f:
-            return yaml.safe_load(f)
+        with open(path, "rb") as f:
+            return YAMLReader.parse_yaml(f.read())
+
+    @staticmethod
+    def parse_yaml(content: bytes | str) -> dict:
+        return yaml.load(content, Loader=_SafeLoader)
@@ -0,0 +1,104 @@
+import asyncio
+import datetime
+import logging
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import pytest
+
+from undore_rbac.base_manager import BaseRBACManager, Access
+from undore_rbac.interfaces.config import RBACConfig, RBACCacheConfig, RBACAuthorizationCacheConfig
+from undore_rbac.interfaces.permissions import PermissionRecord
+from undore_rbac.services import rbac_service
+
+RBAC_MAP = """
+users:
+  view:
+  delete:
+"""
+
+
+class FakeRBACManager(BaseRBACManager):
+    """
+    RBAC Manager, which grants users.view with the current `value`.
+    Every fetch waits for `release` (set by default), so tests can change data or invalidate while a fetch is in progress
+    """
+    def __init__(self):
+        self.value = True
+        self.calls = 0
+        self.error: Optional[Exception] = None
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def authorize(self, token, request=None, custom_meta=None):
+        return 1
+
+    async def fetch_user_access(self, user_id: Any, custom_meta: Optional[dict] = None) -> Access:
+        self.calls += 1
+        value, error = self.value, self.error  # Read when the query starts, like a database would
+
+        await self.release.wait()
+
+        if error is not None:
+            raise error
+
+        return {"permissions": [PermissionRecord(1, "users.view", user_id, None, value, datetime.datetime(2025, 1, 1))], "roles": [], "user": None}
+
+
+@pytest.fixture
+def manager() -> FakeRBACManager:
+    return FakeRBACManager()
+
+
+@pytest.fixture
+def make_service(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(rbac_service, "inject", lambda *args, **kwargs: None)
+    (path := tmp_path / "rbac_map.yml").write_text(RBAC_MAP)
+
+    def make(authorization_cache_config: Optional[RBACAuthorizationCacheConfig] = None, **cache_config) -> rbac_service.RbacService:
+        config = RBACConfig(
+            rbac_map_path=str(path), rbac_manager=manager, access_cache_config=RBACCacheConfig(**cache_config),
+            authorization_cache_config=authorization_cache_config or RBACAuthorizationCacheConfig()
+        )
+        service = rbac_service.RbacService(SimpleNamespace(app=SimpleNamespace(add_event_handler=lambda *args: None)), config)
+        service.logger = logging.getLogger("undore_rbac.tests")
+        return service
+
+    return make
+
+
+def granted(access: Access) -> bool:
+    return access["permissions"][0].value
+
+
+@pytest.fixture
+def make_gate(manager, tmp_path):
+    from undore_rbac.processes.gate import RBACGate
+    from undore_rbac.types.rbac_map import RBACMap
+
+    def make(rbac_map: str | RBACMap, permissions: list, roles: list = (), **kwargs) -> RBACGate:
+        if isinstance(rbac_map, str):
+            (path := tmp_path / "gate_rbac_map.yml").write_text(rbac_map)
+            rbac_map = RBACMap(str(path))
+
+        config = RBACConfig(rbac_map_path=rbac_map.map_path, rbac_manager=manager)
+        return RBACGate(user_permissions=list(permissions), user_roles=list(roles), rbac_map=rbac_map, config=config, **kwargs)
+
+    return make
+
+
+def record(id: int, permission: str, value: bool = True, user_id: Any = None, role_id: Any = None, seconds: int = 0,
+           expires_at: Optional[datetime.datetime] = None) -> PermissionRecord:
+    """
+    Permission record, created `seconds` after 2025-01-01
+    """
+    return PermissionRecord(id, permission, user_id, role_id, value, datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=seconds), expires_at)
+
+
+def write(folder, files: dict[str, str]) -> str:
+    """
+    Folder RBAC Map of `files` (name -> content)
+    """
+    for name, content in files.items():
+        (folder / name).write_text(content)
+    return str(folder)
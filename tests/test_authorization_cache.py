@@ -0,0 +1,65 @@
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from undore_rbac.interfaces.config import RBACAuthorizationCacheConfig
+
+
+@pytest.fixture
+def service(make_service):
+    return make_service(authorization_cache_config=RBACAuthorizationCacheConfig(use=True, negative_ttl=60))
+
+
+async def authorize_failing(service, manager, error: BaseException, times: int = 3) -> list[BaseException]:
+    async def authorize(token, request=None, custom_meta=None):
+        manager.calls += 1
+        raise error
+
+    manager.authorize = authorize
+    errors = []
+
+    for _ in range(times):
+        with pytest.raises(type(error)) as info:
+            await service.authorize("token")
+        errors.append(info.value)
+
+    return errors
+
+
+async def test_invalid_token_is_cached(service, manager):
+    errors = await authorize_failing(service, manager, jwt.InvalidSignatureError("bad signature"))
+
+    assert manager.calls == 1
+    assert all(str(error) == "bad signature" for error in errors)
+
+    # Every request gets its own exception, not the one cached instance with a growing traceback
+    assert len({id(error) for error in errors}) == len(errors)
+
+
+async def test_unavailable_identity_service_is_not_cached(service, manager):
+    await authorize_failing(service, manager, HTTPException(503, "identity service is unavailable"))
+
+    assert manager.calls == 3
+
+
+class InvalidToken(HTTPException):
+    pass
+
+
+async def test_keyword_constructed_exception_is_cached(service, manager):
+    manager.negative_cache_exceptions = (InvalidToken,)
+
+    errors = await authorize_failing(service, manager, InvalidToken(status_code=401, detail="invalid token"))
+
+    assert manager.calls == 1
+    assert all(isinstance(error, InvalidToken) and (error.status_code, error.detail) == (401, "invalid token") for error in errors)
+    assert len({id(error) for error in errors}) == len(errors)
+
+
+async def test_cached_failure_does_not_keep_traceback(service, manager):
+    await authorize_failing(service, manager, jwt.InvalidSignatureError("bad signature"), times=1)
+
+    (_, failure), = service.authorization_cache.items()
+
+    assert failure.exception.__traceback__ is None
+    assert failure.exception.__context__ is None
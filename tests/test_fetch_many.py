@@ -0,0 +1,51 @@
+from conftest import record
+from undore_rbac.cache_backends.memory import MemoryCacheBackend
+
+
+class CountingBackend(MemoryCacheBackend):
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    async def set(self, user_id, custom_meta, access, ttl=None):
+        self.writes.append("set")
+        await super().set(user_id, custom_meta, access, ttl=ttl)
+
+    async def set_many(self, accesses, custom_meta, ttls=None):
+        self.writes.append("set_many")
+        await super().set_many(accesses, custom_meta, ttls=ttls)
+
+
+async def test_fetched_access_is_cached_in_one_write(make_service, manager):
+    backend = CountingBackend()
+    service = make_service(use=True, backend=backend)
+
+    result = await service.fetch_many_user_access([1, 2, 3, 2])
+
+    assert list(result) == [1, 2, 3]
+    assert backend.writes == ["set_many"]
+    assert manager.calls == 3  # Default fetch_many_user_access of BaseRBACManager
+
+    # Cached users are not fetched or written again
+    await service.fetch_many_user_access([1, 2, 3, 4])
+
+    assert manager.calls == 4
+    assert backend.writes == ["set_many", "set"]
+
+
+
+async def test_check_access_many_uses_service_config(make_service, manager, monkeypatch):
+    service = make_service()
+    service.config.require_sorted_permissions = False
+
+    async def fetch_user_access(user_id, custom_meta=None):
+        # Older records first, sorted by the gate, because require_sorted_permissions is disabled
+        return {"permissions": [record(1, "users.view", False, user_id=user_id), record(2, "users.view", True, user_id=user_id, seconds=1)],
+                "roles": [], "user": None}
+
+    monkeypatch.setattr(manager, "fetch_user_access", fetch_user_access)
+
+    assert await service.check_access_many([1, 2], ["users.view", "users.delete"]) == {
+        1: {"users.view": True, "users.delete": False},
+        2: {"users.view": True, "users.delete": False},
+    }
@@ -0,0 +1,135 @@
+import datetime
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import record, write
+from undore_rbac.interfaces.permissions import RoleRecord
+from undore_rbac.types.rbac_map import RBACMap
+from undore_rbac.utils.ttl_cache import TTLCache
+
+RBAC_MAP = """
+a:
+  x:
+  y:
+  z:
+"""
+
+
+@pytest.mark.parametrize("role_layers", [None, TTLCache(16)], ids=["uncached", "cached layers"])
+def test_newest_record_wins_between_roles_of_equal_priority(make_gate, role_layers):
+    permissions = [
+        record(1, "a.y", role_id="A", seconds=3),
+        record(2, "a.x", False, role_id="B", seconds=2),
+        record(3, "a.x", True, role_id="A", seconds=1),
+    ]
+    gate = make_gate(RBAC_MAP, permissions, [RoleRecord("A", 5), RoleRecord("B", 5)], role_layers=role_layers)
+
+    assert gate.user_permissions_dict == {"a.y": True, "a.x": False}
+    assert gate.check_many(["a.x", "a.y"]) == {"a.x": False, "a.y": True}
+
+
+
+EXPIRES_AT = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Sets time.time to a second before EXPIRES_AT. Move it with clock.now
+    """
+    clock = SimpleNamespace(now=EXPIRES_AT.timestamp() - 1)
+    monkeypatch.setattr(time, "time", lambda: clock.now)
+    return clock
+
+
+def test_expired_permission_is_dropped_by_every_view(make_gate, clock):
+    gate = make_gate(RBAC_MAP, [record(1, "a.x", user_id=1, seconds=1, expires_at=EXPIRES_AT), record(2, "a.y", user_id=1)])
+
+    assert gate.expires_at == EXPIRES_AT
+    assert gate.user_permissions == [("a.x", True), ("a.y", True)]
+    snapshot = gate.snapshot
+    assert snapshot.expires_at == EXPIRES_AT.timestamp()
+
+    clock.now = EXPIRES_AT.timestamp()
+
+    assert gate.expires_at is None
+    assert gate.user_permissions_dict == {"a.y": True}
+    assert gate.user_permissions == [("a.y", True)]
+    assert gate.snapshot is not snapshot and not gate.snapshot.has("a.x")
+    assert snapshot.has("a.x")  # A kept snapshot is stale, see RBACSnapshot.expires_at
+
+
+@pytest.mark.parametrize("check", ["check_access", "check_many"])
+def test_expired_permission_is_dropped_by_checks(make_gate, clock, check):
+    gate = make_gate(RBAC_MAP, [record(1, "a.x", user_id=1, expires_at=EXPIRES_AT)])
+    requirements = gate.rbac_map.compile_requirements(["a.x"])
+
+    assert gate.check_many(["a.x"]) == {"a.x": True}  # Memoized
+    assert gate.check_access(requirements, auto_error=False)[0]
+
+    clock.now = EXPIRES_AT.timestamp()
+
+    if check == "check_access":
+        assert not gate.check_access("a.x", auto_error=False)[0]
+        assert not gate.check_access(requirements, auto_error=False)[0]
+    else:
+        assert gate.check_many(["a.x"]) == {"a.x": False}
+        assert gate.check_many(requirements) == {"a.x": False}
+
+
+
+def compiled_permissions(rbac_map: RBACMap, monkeypatch) -> list[tuple[str, ...]]:
+    """
+    Records permissions of every compile_requirements call, that is of every decision, which is not memoized
+    """
+    compiled = []
+    compile_requirements = rbac_map.compile_requirements
+
+    def record_compile(permissions):
+        compiled.append(tuple(permissions))
+        return compile_requirements(permissions)
+
+    monkeypatch.setattr(rbac_map, "compile_requirements", record_compile)
+    return compiled
+
+
+def test_decisions_are_memoized(make_gate, monkeypatch):
+    gate = make_gate(RBAC_MAP, [record(1, "a.x", user_id=1)])
+    compiled = compiled_permissions(gate.rbac_map, monkeypatch)
+
+    assert gate.check_access("a.x", auto_error=False)[0]
+    assert gate.check_many(["a.x", "a.y"]) == {"a.x": True, "a.y": False}
+    assert compiled == [("a.x",), ("a.y",)]  # The second check of a.x is a memo hit
+
+    gate.update_overrides(user_permissions=[record(1, "a.x", False, user_id=1)], user_roles=False)
+
+    assert not gate.check_access("a.x", auto_error=False)[0]
+    assert compiled[-1] == ("a.x",)
+
+
+def test_decisions_are_dropped_when_lazy_map_loads_more(make_gate, tmp_path, monkeypatch):
+    rbac_map = RBACMap(write(tmp_path, {"a.yml": "x:\n", "b.yml": "y:\n"}), lazy=True)
+    gate = make_gate(rbac_map, [record(1, "a.*", user_id=1)])
+    compiled = compiled_permissions(rbac_map, monkeypatch)
+
+    assert gate.check_access("a.x", auto_error=False)[0]
+    assert gate.check_access("a.x", auto_error=False)[0]
+    assert compiled == [("a.x",)]
+
+    # b is loaded by this check
+    assert not gate.check_access("b.y", auto_error=False)[0]
+    assert rbac_map.pending_namespaces == ()
+
+    assert gate.check_access("a.x", auto_error=False)[0]
+    assert compiled == [("a.x",), ("b.y",), ("a.x",)]
+
+
+def test_decisions_are_bounded(make_gate, monkeypatch):
+    gate = make_gate(RBAC_MAP, [record(1, "a.x", user_id=1)])
+    gate.decisions_max_size = 2
+    compiled = compiled_permissions(gate.rbac_map, monkeypatch)
+
+    assert gate.check_many(["a.x", "a.y", "a.z", "a.x"]) == {"a.x": True, "a.y": False, "a.z": False}
+    assert compiled == [("a.x",), ("a.y",), ("a.z",), ("a.x",)]  # The memo was full and cleared before a.z
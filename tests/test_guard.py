@@ -0,0 +1,17 @@
+import pytest
+
+from undore_rbac.rbac_guard import RBACGuard
+
+
+def test_compile_guards_fails_on_unknown_permission(make_service):
+    service = make_service()
+    guard = RBACGuard("users.view")
+    service.compile_guards()
+    assert guard.requirements.rbac_map is service.rbac_map
+
+    typo = RBACGuard("users.veiw")
+
+    with pytest.raises(ValueError, match="users.veiw"):
+        service.compile_guards()
+
+    assert typo.requirements is None
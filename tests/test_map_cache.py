@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from conftest import write
+from undore_rbac.types.rbac_map import RBACMap
+from undore_rbac.utils.map_cache import CACHE_FORMAT_VERSION
+from undore_rbac.utils.yaml_reader import YAMLReader
+
+FILES = {
+    "users.yml": "view:\n  _config:\n    default: true\n    children:\n      - audit.read: true\ndelete:\n",
+    "audit.yml": "read:\n",
+}
+
+
+@pytest.fixture
+def parsed(monkeypatch) -> list[bytes]:
+    """
+    Records every parsed YAML source
+    """
+    parsed = []
+    parse_yaml = YAMLReader.parse_yaml
+
+    def record_parse(content):
+        parsed.append(content)
+        return parse_yaml(content)
+
+    monkeypatch.setattr(YAMLReader, "parse_yaml", staticmethod(record_parse))
+    return parsed
+
+
+@pytest.fixture
+def map_path(tmp_path) -> str:
+    (folder := tmp_path / "map").mkdir()
+    return write(folder, FILES)
+
+
+def permissions(rbac_map: RBACMap) -> dict:
+    return {name: permission.config.model_dump() for name, permission in rbac_map.index.items()}
+
+
+def test_unchanged_map_is_not_parsed_again(map_path, tmp_path, parsed):
+    cache_path = str(tmp_path / "cache.json")
+
+    compiled = RBACMap(map_path, cache_path=cache_path)
+    assert len(parsed) == 2
+
+    cached = RBACMap(map_path, cache_path=cache_path)
+    assert len(parsed) == 2
+    assert permissions(cached) == permissions(compiled)
+    assert cached.children_of("users.view") == (("audit.read", True),)
+
+
+def test_changed_source_is_parsed_again(map_path, tmp_path, parsed):
+    cache_path = str(tmp_path / "cache.json")
+    RBACMap(map_path, cache_path=cache_path)
+
+    (tmp_path / "map" / "audit.yml").write_text("read:\nexport:\n")
+    parsed.clear()
+
+    rbac_map = RBACMap(map_path, cache_path=cache_path)
+
+    assert parsed == [b"read:\nexport:\n"]  # users.yml is still taken from cache
+    assert rbac_map.find("audit.export") is not None
+
+
+@pytest.mark.parametrize("content", [
+    "{not json",
+    json.dumps({"version": CACHE_FORMAT_VERSION - 1, "sources": {}}),
+    json.dumps({"version": CACHE_FORMAT_VERSION, "sources": {"users.yml": {"digest": None}, "audit.yml": []}}),
+], ids=["corrupt", "old version", "broken sources"])
+def test_broken_cache_is_ignored(map_path, tmp_path, parsed, content):
+    (cache := tmp_path / "cache.json").write_text(content)
+
+    rbac_map = RBACMap(map_path, cache_path=str(cache))
+    assert len(parsed) == 2
+    assert rbac_map.find("users.delete") is not None
+
+    # Replaced with a valid one
+    RBACMap(map_path, cache_path=str(cache))
+    assert len(parsed) == 2
@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import write
+from undore_rbac.types.rbac_map import RBACMap
+
+
+def test_lazy_cycle_leaves_map_unchanged(tmp_path):
+    rbac_map = RBACMap(write(tmp_path, {
+        "a.yml": "x:\n  _config:\n    children:\n      - b.y: true\n",
+        "b.yml": "y:\n  _config:\n    children:\n      - a.x: true\n",
+        "c.yml": "z:\n",
+    }), lazy=True)
+
+    length, index, generation = len(rbac_map), dict(rbac_map.index), rbac_map.generation
+
+    # The cycle is found on every use, not only on the first one
+    for _ in range(2):
+        with pytest.raises(ValueError, match="cycle"):
+            rbac_map.find("a.x")
+
+        assert len(rbac_map) == length
+        assert dict(rbac_map.index) == index
+        assert rbac_map.pending_namespaces == ("a", "b", "c")
+
+    assert rbac_map.generation > generation
+    assert rbac_map.ordinal("c") == len(index)  # Ordinals of rolled back permissions are given again
+
+
+def test_lazy_children_are_resolved_across_namespaces(tmp_path):
+    rbac_map = RBACMap(write(tmp_path, {
+        "a.yml": "x:\n  _config:\n    children:\n      - b.y: true\n",
+        "b.yml": "y:\n  _config:\n    children:\n      - b.z: true\nz:\n",
+    }), lazy=True)
+
+    assert rbac_map.find("a.x") is not None
+    assert rbac_map.children_of("a.x") == (("b.y", True), ("b.z", True))
+    assert rbac_map.pending_namespaces == ()
+
+
+def test_cycle_fails_eager_map(tmp_path):
+    with pytest.raises(ValueError, match="cycle"):
+        RBACMap(write(tmp_path, {
+            "a.yml": "x:\n  _config:\n    children:\n      - b.y: true\n",
+            "b.yml": "y:\n  _config:\n    children:\n      - a.x: true\n",
+        }))
+
+
+@pytest.mark.parametrize("files", [
+    {"users.yml": "view:\n", "users.yaml": "delete:\n"},
+    {"undore_rbac.wildcard.yml": "other:\n"},
+], ids=["same prefix", "default permission"])
+def test_file_name_conflicts_fail_lazy_map(tmp_path, files):
+    with pytest.raises(ValueError, match="is defined in both"):
+        RBACMap(write(tmp_path, files), lazy=True)
+
+
+def test_lazy_conflict_fails_on_every_use(tmp_path):
+    rbac_map = RBACMap(write(tmp_path, {
+        "users.yml": "admin:\n",
+        "users.admin.yml": "ban:\n",
+    }), lazy=True)
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="users.admin is defined in both"):
+            rbac_map.find("users.admin")
+
+    with pytest.raises(ValueError):
+        rbac_map.load_all()
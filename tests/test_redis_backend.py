@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+
+from undore_rbac.interfaces.permissions import PermissionRecord, RoleRecord
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from undore_rbac.cache_backends.redis import RedisCacheBackend  # noqa: E402
+
+
+def access(user_id, role_id) -> dict:
+    return {
+        "permissions": [PermissionRecord(1, "users.view", user_id, None, True, datetime.datetime(2025, 1, 1))],
+        "roles": [RoleRecord(role_id, 1)],
+        "user": None
+    }
+
+
+@pytest.fixture
+async def workers():
+    """
+    Two workers with local caches, sharing one Redis server
+    """
+    server = fakeredis.FakeServer()
+    backends = [RedisCacheBackend(fakeredis.FakeAsyncRedis(server=server), local_ttl=60) for _ in range(2)]
+
+    for backend in backends:
+        await backend.start()
+
+    yield backends
+
+    for backend in backends:
+        await backend.close()
+
+
+async def published() -> None:
+    # Let the listeners receive the message
+    for _ in range(20):
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.parametrize("make_id", [lambda: 1, lambda: "user", uuid.uuid4], ids=["int", "str", "uuid"])
+async def test_invalidate_user_reaches_other_workers(workers, make_id):
+    first, second = workers
+    user_id = make_id()
+
+    await first.set(user_id, None, access(user_id, 1))
+    await second.invalidate_user(user_id)
+    await published()
+
+    assert first.local.get((user_id, None)) is None
+    assert await first.get(user_id, None) is None
+
+
+@pytest.mark.parametrize("role_ids", [(1, 2), (uuid.uuid4(), uuid.uuid4())], ids=["int", "uuid"])
+async def test_invalidate_role_reaches_other_workers(workers, role_ids):
+    first, second = workers
+    role_id, other_role_id = role_ids
+
+    await first.set(1, None, access(1, role_id))
+    await first.set(2, None, access(2, other_role_id))
+    await second.invalidate_role(role_id)
+    await published()
+
+    assert await first.get(1, None) is None
+    assert await first.get(2, None) is not None
+
+
+async def test_revalidation_with_datetime_version(make_service, manager):
+    version = datetime.datetime(2025, 1, 1, 12, 30)
+    fetch_user_access = manager.fetch_user_access
+
+    async def fetch_versioned(user_id, custom_meta=None):
+        return {**await fetch_user_access(user_id, custom_meta), "version": version}
+
+    async def fetch_access_version(user_id, custom_meta=None):
+        return version
+
+    manager.fetch_user_access, manager.fetch_access_version = fetch_versioned, fetch_access_version
+
+    backend = RedisCacheBackend(fakeredis.FakeAsyncRedis(), local_ttl=0)
+    service = make_service(use=True, revalidate_after=0, backend=backend)
+
+    await service.fetch_user_access(1)
+    await service.fetch_user_access(1)  # Revalidated, its version came back from Redis as a string
+
+    assert manager.calls == 1
+
+
+async def test_set_many(workers):
+    first, second = workers
+
+    await first.set_many({1: access(1, 1), 2: access(2, 2)}, None, ttls={2: 5})
+
+    assert set(await second.get_many([1, 2, 3], None)) == {1, 2}
+
+    # A short entry does not shorten an index, which is shared with other entries
+    assert await first.client.pttl(f"{first.prefix}role:2") > 5000
+
+    await second.invalidate_role(2)
+    await published()
+
+    assert set(await first.get_many([1, 2], None)) == {1}
@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import record, write
+from undore_rbac.interfaces.permissions import RoleRecord
+from undore_rbac.rbac_guard import RBACGuard
+from undore_rbac.types.rbac_map import RBACMap, RBACMapDiff
+
+
+async def test_reload_rebinds_unchanged_role_layers(make_service, make_gate, tmp_path):
+    service = make_service()
+    previous = service.rbac_map
+
+    gate = make_gate(previous, [record(1, "users.view", role_id="viewer"), record(2, "users.delete", role_id="admin")],
+                     [RoleRecord("viewer", 1), RoleRecord("admin", 2)], role_layers=service.role_layers)
+    assert gate.user_permissions_dict == {"users.delete": True, "users.view": True}
+
+    (tmp_path / "rbac_map.yml").write_text("users:\n  view:\n  delete:\n    _config:\n      explicit: true\n  export:\n")
+    diff = await service.reload_map()
+
+    assert diff == RBACMapDiff(added=frozenset({"users.export"}), removed=frozenset(), changed=frozenset({"users.delete"}))
+    assert service.rbac_map is not previous
+
+    # The layer with a changed permission is dropped, the other one is kept for the new map
+    layers = [layer for _, layer in service.role_layers.items()]
+    assert [layer.role_id for layer in layers] == ["viewer"]
+    assert layers[0].rbac_map is service.rbac_map
+
+
+async def test_reload_keeps_map_if_guard_permission_is_removed(make_service, tmp_path):
+    service = make_service()
+    guard = RBACGuard("users.delete")
+    service.compile_guards()
+    previous, requirements = service.rbac_map, guard.requirements
+
+    (tmp_path / "rbac_map.yml").write_text("users:\n  view:\n")
+
+    with pytest.raises(ValueError, match="users.delete"):
+        await service.reload_map()
+
+    assert service.rbac_map is previous
+    assert guard.requirements is requirements
+
+
+def test_reloader_copies_sources_right_away(tmp_path):
+    rbac_map = RBACMap(write(tmp_path, {"a.yml": "x:\n", "b.yml": "y:\n"}), lazy=True)
+
+    reload = rbac_map.reloader()
+    rbac_map.load_namespace("a")  # For example, by a request, while the new map is read in a worker thread
+
+    assert reload().pending_namespaces == ("a", "b")
+    assert rbac_map.reload().pending_namespaces == ("b",)  # Namespaces in use are kept loaded
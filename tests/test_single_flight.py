@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from conftest import granted
+
+
+async def started(manager, calls: int = 1) -> None:
+    """
+    Wait until the manager was called `calls` times
+    """
+    while manager.calls < calls:
+        await asyncio.sleep(0)
+
+
+async def test_concurrent_callers_share_one_fetch(make_service, manager):
+    service = make_service(use=True)
+    manager.release.clear()
+
+    callers = [asyncio.ensure_future(service.fetch_user_access(1)) for _ in range(50)]
+    await started(manager)
+    manager.release.set()
+
+    results = await asyncio.gather(*callers)
+
+    assert manager.calls == 1
+    assert all(access is results[0] for access in results)
+
+
+async def test_single_flight_without_cache(make_service, manager):
+    service = make_service(use=False)
+    manager.release.clear()
+
+    callers = [asyncio.ensure_future(service.fetch_user_access(1)) for _ in range(10)]
+    await started(manager)
+    manager.release.set()
+    await asyncio.gather(*callers)
+
+    assert manager.calls == 1
+
+    # Nothing is cached, the next call fetches again
+    await service.fetch_user_access(1)
+    assert manager.calls == 2
+
+
+async def test_error_reaches_every_waiter(make_service, manager):
+    service = make_service(use=True)
+    manager.error = RuntimeError("database is down")
+    manager.release.clear()
+
+    callers = [asyncio.ensure_future(service.fetch_user_access(1)) for _ in range(10)]
+    await started(manager)
+    manager.release.set()
+
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert manager.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    # Errors are not cached
+    manager.error = None
+    assert granted(await service.fetch_user_access(1))
+    assert manager.calls == 2
+
+
+async def test_cancelled_waiter_does_not_cancel_others(make_service, manager):
+    service = make_service(use=True)
+    manager.release.clear()
+
+    cancelled = asyncio.ensure_future(service.fetch_user_access(1))
+    others = [asyncio.ensure_future(service.fetch_user_access(1)) for _ in range(5)]
+    await started(manager)
+
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+    manager.release.set()
+    results = await asyncio.gather(*others)
+
+    assert manager.calls == 1
+    assert all(granted(access) for access in results)
+
+
+@pytest.mark.parametrize("single_flight", [True, False])
+async def test_invalidation_during_fetch(make_service, manager, single_flight):
+    service = make_service(use=True, single_flight=single_flight)
+    manager.release.clear()
+
+    before = asyncio.ensure_future(service.fetch_user_access(1))
+    await started(manager)
+
+    # Permission is revoked while the fetch of old access is in progress
+    manager.value = False
+    await service.invalidate_user(1)
+
+    # A new caller does not join the fetch, which started before the invalidation
+    after = asyncio.ensure_future(service.fetch_user_access(1))
+    manager.release.set()
+
+    assert not granted(await before)
+    assert not granted(await after)
+    assert not granted(await service.fetch_user_access(1))  # Old access was not cached either
+
+
+@pytest.mark.parametrize("invalidate", ["role", "all"])
+async def test_role_invalidation_during_fetch(make_service, manager, invalidate):
+    service = make_service(use=True)
+    manager.release.clear()
+
+    before = asyncio.ensure_future(service.fetch_user_access(1))
+    await started(manager)
+
+    manager.value = False
+    await (service.invalidate_role(1) if invalidate == "role" else service.invalidate_all())
+    manager.release.set()
+
+    assert not granted(await before)
+    assert not granted(await service.fetch_user_access(1))
+
+
+async def test_invalidation_of_another_user_during_fetch(make_service, manager):
+    service = make_service(use=True)
+    manager.release.clear()
+
+    before = asyncio.ensure_future(service.fetch_user_access(1))
+    await started(manager)
+
+    await service.invalidate_user(2)
+    manager.release.set()
+
+    assert granted(await before)
+    await service.fetch_user_access(1)
+    assert manager.calls == 1
+
+
+async def test_invalidation_during_fetch_many(make_service, manager):
+    service = make_service(use=True)
+    manager.release.clear()
+
+    before = asyncio.ensure_future(service.fetch_many_user_access([1, 2]))
+    await started(manager)
+
+    manager.value = False
+    await service.invalidate_user(1)
+    manager.release.set()
+
+    result = await before
+    assert not granted(result[1])
+    assert not granted(await service.fetch_user_access(1))
+
+
+class Unhashable:
+    __hash__ = None
+
+
+@pytest.mark.parametrize("use", [True, False], ids=["cache", "no cache"])
+async def test_unhashable_custom_meta_is_not_shared(make_service, manager, use):
+    service = make_service(use=use)
+    custom_meta = {"model": Unhashable()}
+
+    assert granted(await service.fetch_user_access(1, custom_meta=custom_meta))
+    assert granted(await service.fetch_user_access(1, custom_meta=custom_meta))
+    assert list(await service.fetch_many_user_access([1, 2], custom_meta=custom_meta)) == [1, 2]
+
+    assert manager.calls == 4
@@ -0,0 +1,57 @@
+from undore_rbac.types.rbac_map import RBACMap
+from undore_rbac.types.snapshot import RBACSnapshot
+
+RBAC_MAP = """
+users:
+  view:
+    _config:
+      default: true
+  delete:
+  manage:
+    _config:
+      explicit: true
+audit:
+  export:
+"""
+
+
+def snapshot(rbac_map: RBACMap, permissions: dict[str, bool]) -> RBACSnapshot:
+    return RBACSnapshot.compile(rbac_map, permissions)
+
+
+def test_defaults_are_not_stored_per_user(tmp_path):
+    (path := tmp_path / "rbac_map.yml").write_text(RBAC_MAP)
+    rbac_map = RBACMap(str(path))
+
+    user = snapshot(rbac_map, {"audit.export": True})
+
+    assert user.has("users.view")  # Default
+    assert user.granted == 1 << rbac_map.ordinal("audit.export")
+    assert not user.granted & rbac_map.defaults_mask
+
+    assert not snapshot(rbac_map, {"users.view": False}).has("users.view")
+
+
+def test_wildcards(tmp_path):
+    (path := tmp_path / "rbac_map.yml").write_text(RBAC_MAP)
+    rbac_map = RBACMap(str(path))
+
+    user = snapshot(rbac_map, {"users.*": False, "*": True, "users.delete": True})
+
+    # The first wildcard wins, and wildcards win over values of permissions
+    assert user.check_many(["users.view", "users.delete", "audit.export"]) == {"users.view": False, "users.delete": False, "audit.export": True}
+    assert not user.has("users.manage")  # Explicit
+
+    # Same wildcards share the same masks
+    assert snapshot(rbac_map, {"users.*": False, "*": True}).wildcard_masks is user.wildcard_masks
+
+
+def test_lazy_namespace_defaults(tmp_path):
+    (tmp_path / "users.yml").write_text("view:\n")
+    (tmp_path / "audit.yml").write_text("export:\n  _config:\n    default: true\n")
+    rbac_map = RBACMap(str(tmp_path), lazy=True)
+
+    user = snapshot(rbac_map, {"users.*": True})
+
+    assert user.has("users.view")
+    assert user.has("audit.export")  # Loaded after the snapshot was compiled